@@ -1,10 +1,15 @@
 from flask import Flask
 from flask_cors import CORS
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 
 from api.config import DevConfig, StageConfig, Config, todo_env
+from api.cache import ProjectCache, create_cache_backend
+from api.database import TodoSQLAlchemy, init_replica_routing
+from api.compression import init_compression
+from api.instrumentation import init_instrumentation
+from api.metrics import init_metrics
+from api.responses import create_json_encoder
 
 app = Flask(__name__)
 
@@ -21,10 +26,23 @@ else:
 
 # Enable CORS for all resources
 CORS(app, resources={r'/*': {'origins': '*'}})
+# Compress the responses for clients that accept it
+init_compression(app)
 
-db = SQLAlchemy(app)
+db = TodoSQLAlchemy(app)
+# GET requests read from the replica when one is configured
+init_replica_routing(app, db)
+# Request timings when INSTRUMENTATION_ENABLED is set. after_request hooks run
+# in reverse order, so this one measures the response before compression.
+init_instrumentation(app)
 migrate = Migrate(app, db)
 # Flask-Marshmallow is used for serializing the DB objects to JSON.
 ma = Marshmallow(app)
+# Encoder used for all JSON responses
+app.extensions['json_encoder'] = create_json_encoder(app.config['JSON_ENCODER'])
+# Serialized project trees, invalidated by the routes that modify projects
+project_cache = ProjectCache(create_cache_backend(app.config))
+# Prometheus metrics of the requests, connection pools and project cache
+init_metrics(app, project_cache)
 
 from api import routes, models
\ No newline at end of file
@@ -0,0 +1,149 @@
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+class CacheBackend(object):
+    # Interface of the cache backends. Values are JSON serializable objects.
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class NullCache(CacheBackend):
+    # Used when caching is disabled, every get is a miss
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+class LRUCache(CacheBackend):
+    # In-process cache that drops the least recently used entry when full
+    # and treats entries older than ttl seconds as missing
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCache(CacheBackend):
+    # Shares the cache between workers. Client can be redis.Redis or anything
+    # implementing its get, setex, delete and scan_iter methods.
+    def __init__(self, client, ttl=300, prefix='todo:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, json.dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+def create_cache_backend(config):
+    backend = config['PROJECT_CACHE_BACKEND']
+    if backend == 'memory':
+        return LRUCache(config['PROJECT_CACHE_MAX_SIZE'], config['PROJECT_CACHE_TTL'])
+    elif backend == 'redis':
+        # Redis client is only required when it's used
+        import redis
+        client = redis.Redis.from_url(config['PROJECT_CACHE_REDIS_URL'])
+        return RedisCache(client, config['PROJECT_CACHE_TTL'])
+    elif backend == 'none':
+        return NullCache()
+    raise ValueError(f'Unknown PROJECT_CACHE_BACKEND {backend}')
+
+class ProjectCache(object):
+    # Serialized project trees by project ID. Entries are stored together with
+    # the ETag of the tree they were serialized from, so an entry is only used
+    # while the project is unchanged even if an invalidation was missed.
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, project_id):
+        return f'project:{project_id}'
+
+    def get(self, project_id, etag):
+        entry = self.backend.get(self._key(project_id))
+        if entry is not None and entry['etag'] == etag:
+            self.hits += 1
+            return entry['project']
+        self.misses += 1
+        return None
+
+    def set(self, project_id, etag, project_json):
+        self.backend.set(self._key(project_id), {'etag': etag, 'project': project_json})
+
+    def invalidate(self, *project_ids):
+        self.backend.delete(*[self._key(project_id) for project_id in set(project_ids)])
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses
+        }
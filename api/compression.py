@@ -0,0 +1,78 @@
+import zlib
+
+from flask import current_app, request
+
+# Brotli is offered to the clients only when it's installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def get_available_encodings():
+    # Preferred first when the client accepts both with the same quality
+    if brotli is not None:
+        return ['br', 'gzip']
+    return ['gzip']
+
+def _make_compressor(encoding, config):
+    # Returns functions for compressing a chunk and finishing the stream
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        return compressor.process, compressor.finish
+    # wbits 31 writes gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def compress_data(data, encoding, config):
+    compress, finish = _make_compressor(encoding, config)
+    return compress(data) + finish()
+
+def compress_chunks(chunks, encoding, config, charset='utf-8'):
+    # Compresses streamed response as it's generated instead of buffering it
+    compress, finish = _make_compressor(encoding, config)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            compressed_chunk = compress(chunk)
+            if compressed_chunk:
+                yield compressed_chunk
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compress_response(response):
+    config = current_app.config
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(get_available_encodings())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Size of the streamed responses isn't known beforehand, so they're
+        # always compressed
+        response.response = compress_chunks(response.response, encoding, config, response.charset)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress_data(data, encoding, config))
+    response.headers['Content-Encoding'] = encoding
+
+    # Compressed body isn't byte-for-byte the same as the uncompressed one, so the
+    # ETag becomes weak. If-None-Match uses weak comparison and still matches.
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    app.after_request(compress_response)
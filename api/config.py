@@ -3,6 +3,28 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 todo_env = os.getenv('TODO_ENVIRONMENT')
 
+def get_engine_options(env_suffix=''):
+    # Connection pool settings read from TODO_DATABASE_<SETTING><env_suffix> and
+    # then TODO_DATABASE_<SETTING>. Sizes are per worker process.
+    def get_setting(name, default):
+        return os.getenv(f'TODO_DATABASE_{name}{env_suffix}', os.getenv(f'TODO_DATABASE_{name}', default))
+
+    return {
+        'pool_size': int(get_setting('POOL_SIZE', 5)),
+        'max_overflow': int(get_setting('MAX_OVERFLOW', 10)),
+        'pool_timeout': int(get_setting('POOL_TIMEOUT', 30)),
+        'pool_recycle': int(get_setting('POOL_RECYCLE', 1800)),
+        'pool_pre_ping': get_setting('POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    }
+
+def get_database_binds(env_suffix=''):
+    # Read replica is used for GET requests when TODO_DATABASE_REPLICA_URL<env_suffix>
+    # is set. It isn't migrated, the schema comes from replication.
+    replica_url = os.getenv(f'TODO_DATABASE_REPLICA_URL{env_suffix}')
+    if replica_url:
+        return {'replica': replica_url}
+    return None
+
 class Config(object):
     # Defult production config
     SECRET_KEY = os.getenv(f'SECRET_KEY', 'debugging')
@@ -10,16 +32,74 @@ class Config(object):
     # Database settings
     SQLALCHEMY_DATABASE_URI = os.getenv('sqlite:///')
     SQLALCHEMY_TRACK_MODIFICATIONS = False 
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options()
+    # Milliseconds before PostgreSQL cancels a statement, 0 disables the timeout
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('TODO_DATABASE_STATEMENT_TIMEOUT', 0))
+    SQLALCHEMY_BINDS = get_database_binds()
+    # Seconds a client keeps reading from the primary after its own write, so it
+    # sees the write even when the replica lags behind
+    READ_YOUR_WRITES_WINDOW = int(os.getenv('TODO_READ_YOUR_WRITES_WINDOW', 5))
     
     # CORS
     CORS_HEADERS = 'Content-Type'
 
+    # JSON encoder for the responses: auto uses orjson if it's installed, or json
+    JSON_ENCODER = os.getenv('TODO_JSON_ENCODER', 'auto')
+    JSON_COMPACT = True
+
+    # Response compression, bodies smaller than the minimum size in bytes are sent
+    # as they are. Level is gzip level from 1 to 9 and quality brotli quality from 0 to 11.
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson']
+    COMPRESS_MIN_SIZE = int(os.getenv('TODO_COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('TODO_COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('TODO_COMPRESS_BROTLI_QUALITY', 4))
+
+    # Pagination of the list endpoints
+    PAGINATION_DEFAULT_LIMIT = int(os.getenv('TODO_PAGINATION_DEFAULT_LIMIT', 50))
+    PAGINATION_MAX_LIMIT = int(os.getenv('TODO_PAGINATION_MAX_LIMIT', 500))
+
+    # Maximum number of objects in one bulk create request
+    BULK_MAX_ITEMS = int(os.getenv('TODO_BULK_MAX_ITEMS', 10000))
+
+    # Rows fetched from the database at a time when streaming exports and
+    # rows inserted at a time when importing them
+    EXPORT_BATCH_SIZE = int(os.getenv('TODO_EXPORT_BATCH_SIZE', 1000))
+
+    # Server-Timing header and JSON log line with timings of every request
+    INSTRUMENTATION_ENABLED = os.getenv('TODO_INSTRUMENTATION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # Queries slower than the threshold in milliseconds are logged and kept in
+    # the slow query log, 0 disables it. EXPLAIN of the slow queries is
+    # captured only in development and staging, where it's none, plan or analyze.
+    SLOW_QUERY_THRESHOLD = float(os.getenv('TODO_SLOW_QUERY_THRESHOLD', 500))
+    SLOW_QUERY_LOG_SIZE = int(os.getenv('TODO_SLOW_QUERY_LOG_SIZE', 100))
+    SLOW_QUERY_EXPLAIN = 'none'
+    # The slow query log shows statements with their parameters, so the admin
+    # endpoints serving it are off unless enabled
+    SLOW_QUERY_ENDPOINT_ENABLED = os.getenv('TODO_SLOW_QUERY_ENDPOINT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # Prometheus metrics served at /metrics
+    METRICS_ENABLED = os.getenv('TODO_METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+    # Cache of serialized project trees, backend is memory, redis or none
+    PROJECT_CACHE_BACKEND = os.getenv('TODO_PROJECT_CACHE_BACKEND', 'memory')
+    PROJECT_CACHE_MAX_SIZE = int(os.getenv('TODO_PROJECT_CACHE_MAX_SIZE', 1024))
+    PROJECT_CACHE_TTL = int(os.getenv('TODO_PROJECT_CACHE_TTL', 300))
+    PROJECT_CACHE_REDIS_URL = os.getenv('TODO_PROJECT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
 class DevConfig(Config):
     # Development config with debugging enabled and using dev database
     DEBUG = True
+    JSON_COMPACT = False
     SQLALCHEMY_DATABASE_URI = os.getenv(f'TODO_DATABASE_URL_DEV', 'sqlite:///')
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options('_DEV')
+    SQLALCHEMY_BINDS = get_database_binds('_DEV')
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('TODO_DATABASE_STATEMENT_TIMEOUT_DEV', Config.DATABASE_STATEMENT_TIMEOUT))
+    SLOW_QUERY_EXPLAIN = os.getenv('TODO_SLOW_QUERY_EXPLAIN_DEV', Config.SLOW_QUERY_EXPLAIN)
 
 class StageConfig(Config):
     # Stage config with debugging enabled and using stage database
     DEBUG = True
-    SQLALCHEMY_DATABASE_URI = os.getenv(f'TODO_DATABASE_URL_STAGE', 'sqlite:///')
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.getenv(f'TODO_DATABASE_URL_STAGE', 'sqlite:///')
+    SQLALCHEMY_ENGINE_OPTIONS = get_engine_options('_STAGE')
+    SQLALCHEMY_BINDS = get_database_binds('_STAGE')
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('TODO_DATABASE_STATEMENT_TIMEOUT_STAGE', Config.DATABASE_STATEMENT_TIMEOUT))
+    SLOW_QUERY_EXPLAIN = os.getenv('TODO_SLOW_QUERY_EXPLAIN_STAGE', Config.SLOW_QUERY_EXPLAIN)
@@ -0,0 +1,92 @@
+import time
+
+from flask import request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+
+# Engine options that only QueuePool accepts. SQLite uses NullPool for files
+# and StaticPool for in-memory databases.
+queue_pool_options = ['pool_size', 'max_overflow', 'pool_timeout']
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+replica_bind_key = 'replica'
+# Cookie holding the time until which the client reads from the primary
+read_your_writes_cookie = 'todo_primary_until'
+read_methods = ('GET', 'HEAD', 'OPTIONS')
+
+def has_replica(app):
+    return replica_bind_key in (app.config['SQLALCHEMY_BINDS'] or {})
+
+class RoutingSession(SignallingSession):
+    # Sends the queries to the read replica while use_replica is set. Flushes and
+    # everything after the first flush go to the primary, so a read request
+    # that writes anyway stays consistent within its own transaction.
+    def __init__(self, db, **options):
+        self.use_replica = False
+        self.has_written = False
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.use_replica and not self.has_written and not self._flushing:
+            state = get_state(self.app)
+            return state.db.get_engine(self.app, bind=replica_bind_key)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _mark_written(session, flush_context, instances):
+    session.has_written = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _mark_committed(session):
+    session.info['committed'] = True
+
+class TodoSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        # Called with the final options, SQLALCHEMY_ENGINE_OPTIONS included
+        engine_opts = dict(engine_opts)
+        if sa_url.drivername.startswith('sqlite'):
+            for option in queue_pool_options:
+                engine_opts.pop(option, None)
+        elif sa_url.drivername.startswith('postgresql'):
+            statement_timeout = self.get_app().config['DATABASE_STATEMENT_TIMEOUT']
+            if statement_timeout:
+                connect_args = dict(engine_opts.get('connect_args', {}))
+                connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+                engine_opts['connect_args'] = connect_args
+        return super().create_engine(sa_url, engine_opts)
+
+def get_pool_stats(engine):
+    pool = engine.pool
+    pool_stats = {
+        'pool_class': type(pool).__name__,
+        'status': pool.status()
+    }
+    # Counters are available only for QueuePool
+    if hasattr(pool, 'checkedout'):
+        pool_stats['size'] = pool.size()
+        pool_stats['checked_in'] = pool.checkedin()
+        pool_stats['checked_out'] = pool.checkedout()
+        pool_stats['overflow'] = pool.overflow()
+    return pool_stats
+
+def init_replica_routing(app, db):
+    @app.before_request
+    def route_request():
+        # Reads go to the replica unless the client wrote within the read-your-writes
+        # window. The flag is set on every request because the session may outlive one.
+        primary_until = request.cookies.get(read_your_writes_cookie, type=float) or 0
+        db.session().use_replica = (
+            has_replica(app)
+            and request.method in read_methods
+            and primary_until < time.time()
+        )
+
+    @app.after_request
+    def set_read_your_writes_cookie(response):
+        window = app.config['READ_YOUR_WRITES_WINDOW']
+        if db.session().info.pop('committed', False) and has_replica(app) and window > 0:
+            response.set_cookie(read_your_writes_cookie, str(time.time() + window), max_age=window)
+        return response
@@ -0,0 +1,129 @@
+import json
+
+from api import app, db, project_cache
+from api.responses import encode_json
+from api.models import (
+    assignees_for_tasks,
+    Project, ProjectSchema,
+    Task, TaskSchema,
+    User, UserSchema,
+    Comment, CommentSchema
+    )
+
+# Export is newline-delimited JSON with one record per line, for example
+# {"type": "task", "data": {"id": 1, "name": "Test task", ...}}
+# Relationships are exported as their own flat records in the order they can be
+# imported: users, projects, tasks, comments and assignees.
+
+record_schemas = {
+    'user': UserSchema(),
+    'project': ProjectSchema(exclude=('tasks',)),
+    'task': TaskSchema(exclude=('comments', 'assignees', 'comment_count')),
+    'comment': CommentSchema()
+}
+
+# Import keeps the exported IDs so that the references stay valid
+import_schemas = {
+    'user': UserSchema(many=True, transient=True),
+    'project': ProjectSchema(many=True, transient=True, exclude=('tasks',)),
+    'task': TaskSchema(many=True, transient=True, exclude=('comments', 'assignees', 'comment_count')),
+    'comment': CommentSchema(many=True, transient=True)
+}
+
+def _columns(model):
+    # Plain column rows are dumped instead of ORM objects, nothing is hydrated
+    return [getattr(model, column.key) for column in model.__table__.columns]
+
+def _make_record(record_type, data):
+    # Records are always compact, every record has to fit on one line
+    return encode_json({'type': record_type, 'data': data}, compact=True).decode('utf-8') + '\n'
+
+def export_records(project_id=None, batch_size=None):
+    # Yields NDJSON lines of the whole database or of one project with its tasks,
+    # comments, assignees and the users referenced by them
+    batch_size = batch_size or app.config['EXPORT_BATCH_SIZE']
+    users = db.session.query(*_columns(User))
+    projects = db.session.query(*_columns(Project))
+    tasks = db.session.query(*_columns(Task))
+    comments = db.session.query(*_columns(Comment))
+    assignees = db.session.query(assignees_for_tasks.c.task_id, assignees_for_tasks.c.assignee_id)
+
+    if project_id is not None:
+        project_task_ids = db.session.query(Task.id).filter(Task.project_id == project_id)
+        assignee_ids = db.session.query(assignees_for_tasks.c.assignee_id) \
+            .filter(assignees_for_tasks.c.task_id.in_(project_task_ids))
+        author_ids = db.session.query(Comment.author_id).filter(Comment.task_id.in_(project_task_ids))
+        users = users.filter(db.or_(User.id.in_(assignee_ids), User.id.in_(author_ids)))
+        projects = projects.filter(Project.id == project_id)
+        tasks = tasks.filter(Task.project_id == project_id)
+        comments = comments.filter(Comment.task_id.in_(project_task_ids))
+        assignees = assignees.filter(assignees_for_tasks.c.task_id.in_(project_task_ids))
+
+    for record_type, query, key in [
+        ('user', users, User.id),
+        ('project', projects, Project.id),
+        ('task', tasks, Task.id),
+        ('comment', comments, Comment.id)
+    ]:
+        schema = record_schemas[record_type]
+        # yield_per streams the rows from a server-side cursor, so only one batch
+        # is held in memory at a time
+        for row in query.order_by(key).yield_per(batch_size):
+            yield _make_record(record_type, schema.dump(row))
+
+    assignees = assignees.order_by(assignees_for_tasks.c.task_id, assignees_for_tasks.c.assignee_id)
+    for task_id, assignee_id in assignees.yield_per(batch_size):
+        yield _make_record('assignee', {'task_id': task_id, 'assignee_id': assignee_id})
+
+def _insert_batch(record_type, batch):
+    if record_type == 'assignee':
+        db.session.execute(assignees_for_tasks.insert(), batch)
+        return
+    schema = import_schemas[record_type]
+    db.session.bulk_save_objects(schema.load(batch))
+
+def _reset_sequences():
+    # Rows were inserted with explicit IDs, so PostgreSQL sequences have to be
+    # moved past them for the next inserts
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for table_name in ['user', 'project', 'task', 'comment']:
+        db.session.execute(
+            f'SELECT setval(pg_get_serial_sequence(\'"{table_name}"\', \'id\'), '
+            f'coalesce((SELECT max(id) FROM "{table_name}"), 1))'
+        )
+
+def import_records(lines, batch_size=None):
+    # Loads lines written by export_records in batches of the same record type
+    # within one transaction. Returns the count of imported records by type.
+    batch_size = batch_size or app.config['EXPORT_BATCH_SIZE']
+    counts = {}
+    batch_type = None
+    batch = []
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                record_type = record['type']
+                data = record['data']
+            except (ValueError, KeyError, TypeError):
+                raise ValueError(f'Invalid record on line {line_number}')
+            if record_type not in record_schemas and record_type != 'assignee':
+                raise ValueError(f'Unknown record type {record_type} on line {line_number}')
+            if batch and (record_type != batch_type or len(batch) >= batch_size):
+                _insert_batch(batch_type, batch)
+                batch = []
+            batch_type = record_type
+            batch.append(data)
+            counts[record_type] = counts.get(record_type, 0) + 1
+        if batch:
+            _insert_batch(batch_type, batch)
+        _reset_sequences()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    project_cache.clear()
+    return counts
@@ -0,0 +1,175 @@
+import json
+import logging
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from threading import Lock
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Per request timings when INSTRUMENTATION_ENABLED is set. Every request gets
+# Server-Timing header and one JSON log line with wall time, database time,
+# query count and response size. Queries run while streaming a response happen
+# after it's measured and aren't included.
+#
+# Independently of that, queries slower than SLOW_QUERY_THRESHOLD are logged
+# with their parameters and route and kept in SlowQueryLog. That includes the
+# lazy loads made while dumping the responses, they run within the request.
+
+# Statements that EXPLAIN accepts
+explainable_statement = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+def _format_parameters(parameters):
+    # Bind parameters as JSON serializable values
+    if isinstance(parameters, dict):
+        return {key: _format_parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_format_parameters(value) for value in parameters]
+    if parameters is None or isinstance(parameters, (str, int, float, bool)):
+        return parameters
+    return str(parameters)
+
+def _explain(conn, statement, parameters, explain):
+    # Runs EXPLAIN on a raw cursor of the same connection, so it sees the
+    # uncommitted changes of the transaction and isn't instrumented itself
+    cursor = conn.connection.cursor()
+    try:
+        if conn.dialect.name == 'postgresql':
+            # The savepoint undoes the changes ANALYZE makes when it executes the
+            # statement and keeps the transaction usable if EXPLAIN fails
+            options = '(ANALYZE, BUFFERS) ' if explain == 'analyze' else ''
+            cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(f'EXPLAIN {options}{statement}', parameters)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        if conn.dialect.name == 'sqlite':
+            # SQLite doesn't execute the statement, there's only the plan
+            cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+        return None
+    finally:
+        cursor.close()
+
+class SlowQueryLog(object):
+    # Recent slow queries of this process, the oldest are dropped when it's full
+    def __init__(self):
+        self.app = None
+        self._queries = deque()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self._queries = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+
+    def record(self, conn, statement, parameters, executemany, duration):
+        if self.app is None:
+            return
+        config = self.app.config
+        duration_ms = duration * 1000
+        if not config['SLOW_QUERY_THRESHOLD'] or duration_ms < config['SLOW_QUERY_THRESHOLD']:
+            return
+        slow_query = {
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': duration_ms,
+            'statement': statement,
+            'parameters': _format_parameters(parameters),
+            'method': request.method if has_request_context() else None,
+            'path': request.path if has_request_context() else None,
+            'endpoint': request.endpoint if has_request_context() else None
+        }
+        explain = config['SLOW_QUERY_EXPLAIN']
+        if explain in ('plan', 'analyze') and not executemany and explainable_statement.match(statement):
+            try:
+                slow_query['explain'] = _explain(conn, statement, parameters, explain)
+            except Exception as e:
+                slow_query['explain_error'] = str(e)
+        logger.warning(json.dumps(slow_query, separators=(',', ':')))
+        with self._lock:
+            self._queries.append(slow_query)
+
+    def get_queries(self):
+        # Newest first
+        with self._lock:
+            return list(reversed(self._queries))
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+
+slow_query_log = SlowQueryLog()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_times')
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    slow_query_log.record(conn, statement, parameters, executemany, duration)
+    if has_request_context():
+        timing = g.get('request_timing')
+        if timing is not None:
+            timing['db_time'] += duration
+            timing['query_count'] += 1
+
+def _format_server_timing(timing):
+    return ', '.join([
+        f'app;dur={timing["duration_ms"]:.2f}',
+        f'db;dur={timing["db_ms"]:.2f};desc="{timing["query_count"]} queries"'
+    ])
+
+def _init_logger():
+    # Without a handler Python only prints warnings, so the timing lines would be
+    # dropped. Under gunicorn they go to its error log, otherwise to stderr.
+    if logger.handlers:
+        return
+    handlers = logging.getLogger('gunicorn.error').handlers
+    if not handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(name)s: %(message)s'))
+        handlers = [handler]
+    for handler in handlers:
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+def init_instrumentation(app):
+    # Listeners are on all engines, so reads from the replica are counted too
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    slow_query_log.init_app(app)
+
+    @app.before_request
+    def start_request_timing():
+        if app.config['INSTRUMENTATION_ENABLED']:
+            _init_logger()
+            g.request_timing = {'start': time.perf_counter(), 'db_time': 0.0, 'query_count': 0}
+
+    @app.after_request
+    def finish_request_timing(response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+        request_timing = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': (time.perf_counter() - timing['start']) * 1000,
+            'db_ms': timing['db_time'] * 1000,
+            'query_count': timing['query_count'],
+            # Size before compression, unknown for streamed responses
+            'response_bytes': None if response.is_streamed else len(response.get_data())
+        }
+        response.headers.add('Server-Timing', _format_server_timing(request_timing))
+        logger.info(json.dumps(request_timing, separators=(',', ':')))
+        return response
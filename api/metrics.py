@@ -0,0 +1,114 @@
+import os
+import time
+from threading import Lock
+
+from flask import g, request
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram,
+    CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+# Prometheus metrics of the requests, database connections and project cache.
+# Under gunicorn every worker writes its samples to files in the directory of
+# prometheus_multiproc_dir (see gunicorn.conf.py) and /metrics aggregates them,
+# so it doesn't matter which worker answers the scrape. Recording is a few
+# in-memory or mmap writes per request.
+
+request_latency = Histogram(
+    'todo_http_request_duration_seconds',
+    'Request latency by route',
+    ['method', 'endpoint'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+request_count = Counter(
+    'todo_http_requests_total',
+    'Requests by route and status',
+    ['method', 'endpoint', 'status']
+)
+requests_in_progress = Gauge(
+    'todo_http_requests_in_progress',
+    'Requests being handled',
+    multiprocess_mode='livesum'
+)
+db_connections_checked_out = Gauge(
+    'todo_db_connections_checked_out',
+    'Database connections checked out from the pools',
+    multiprocess_mode='livesum'
+)
+db_connections_opened = Counter(
+    'todo_db_connections_opened_total',
+    'Database connections opened by the pools'
+)
+project_cache_requests = Counter(
+    'todo_project_cache_requests_total',
+    'Project cache lookups by result',
+    ['result']
+)
+
+def _on_connect(dbapi_connection, connection_record):
+    db_connections_opened.inc()
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    db_connections_checked_out.inc()
+
+def _on_checkin(dbapi_connection, connection_record):
+    db_connections_checked_out.dec()
+
+class _CacheCounts(object):
+    # Copies the hit and miss counts of ProjectCache to the counter. The cache
+    # counts are reset when it's cleared, so only increases are added.
+    def __init__(self):
+        self.recorded = {'hits': 0, 'misses': 0}
+        self._lock = Lock()
+
+    def record(self, project_cache):
+        stats = project_cache.stats()
+        with self._lock:
+            for name, result in [('hits', 'hit'), ('misses', 'miss')]:
+                recorded = self.recorded[name]
+                if stats[name] < recorded:
+                    recorded = 0
+                if stats[name] > recorded:
+                    project_cache_requests.labels(result).inc(stats[name] - recorded)
+                self.recorded[name] = stats[name]
+
+def generate_metrics():
+    # Returns the exposition body and its content type
+    if 'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def init_metrics(app, project_cache):
+    event.listen(Pool, 'connect', _on_connect)
+    event.listen(Pool, 'checkout', _on_checkout)
+    event.listen(Pool, 'checkin', _on_checkin)
+    cache_counts = _CacheCounts()
+
+    @app.before_request
+    def start_request_metrics():
+        if not app.config['METRICS_ENABLED']:
+            return
+        g.metrics_start = time.perf_counter()
+        requests_in_progress.inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            # Unmatched URLs don't have an endpoint, they're grouped together
+            endpoint = request.endpoint or 'none'
+            request_latency.labels(request.method, endpoint).observe(time.perf_counter() - start)
+            request_count.labels(request.method, endpoint, response.status_code).inc()
+            cache_counts.record(project_cache)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exception=None):
+        # Teardown runs even when the request failed, so the gauge stays balanced
+        if g.pop('metrics_start', None) is not None:
+            requests_in_progress.dec()
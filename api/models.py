@@ -1,13 +1,20 @@
 from api import db, ma
-from api.utilities import generate_uuid
+from api.utilities import generate_uuid, make_version, paginate
 from datetime import datetime
 
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import selectinload
+from marshmallow import fields, pre_load
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from marshmallow_sqlalchemy.fields import Nested
 
 assignees_for_tasks = db.Table('assignees_for_tasks',
     db.Column('assignee_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('task_id', db.Integer, db.ForeignKey('task.id'))
+    db.Column('task_id', db.Integer, db.ForeignKey('task.id')),
+    # Task assignees are loaded by task and user's tasks by assignee, both
+    # indexes cover the whole row so the other column is read from the index
+    db.Index('ix_assignees_for_tasks_task_id_assignee_id', 'task_id', 'assignee_id', unique=True),
+    db.Index('ix_assignees_for_tasks_assignee_id_task_id', 'assignee_id', 'task_id')
     )
 
 class Project(db.Model):
@@ -22,7 +29,9 @@ class Project(db.Model):
     planned_complete_date = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
-    tasks = db.relationship('Task', backref='project', lazy='dynamic')
+    # Relationships dumped by the nested schemas are regular lists, so that they
+    # can be loaded in batches with get_tree_options() instead of query per object
+    tasks = db.relationship('Task', backref='project')
 
     def save(self):
         db.session.add(self)
@@ -31,15 +40,105 @@ class Project(db.Model):
         db.session.delete(self)
 
     def has_tasks(self):
-        has_tasks = False
-        tasks = self.tasks.all()
-        if tasks != []:
-            has_tasks = True
-        return has_tasks
+        # EXISTS query, the tasks aren't loaded
+        return db.session.query(
+            Task.query.filter(Task.project_id == self.id).exists()
+        ).scalar()
+
+    @staticmethod
+    def get_counts(project_id):
+        # All counts are scalar subqueries of one SELECT and no rows are loaded.
+        # Returns None if the project doesn't exist.
+        project_tasks = db.session.query(db.func.count(Task.id)).filter(Task.project_id == project_id)
+        project_comments = db.session.query(db.func.count(Comment.id)) \
+            .join(Task, Comment.task_id == Task.id) \
+            .filter(Task.project_id == project_id)
+        counts = db.session.query(
+            Project.query.filter(Project.id == project_id).exists().label('found'),
+            project_tasks.label('tasks'),
+            project_tasks.filter(Task.completed == True).label('completed_tasks'),
+            project_comments.label('comments')
+        ).one()
+        if not counts.found:
+            return None
+        return {
+            'tasks': counts.tasks,
+            'completed_tasks': counts.completed_tasks,
+            'comments': counts.comments
+        }
+
+    @staticmethod
+    def get_tree_options(expand=None):
+        # Loads the tasks of all projects with one IN query and then comments and
+        # assignees of all those tasks with one query each. Expand is the set of
+        # relationships to load, by default all of them.
+        if expand is None:
+            expand = {'tasks', 'tasks.comments', 'tasks.assignees'}
+        options = []
+        if 'tasks' in expand:
+            options.append(selectinload(Project.tasks))
+            if 'tasks.comments' in expand:
+                options.append(selectinload(Project.tasks).selectinload(Task.comments))
+            if 'tasks.assignees' in expand:
+                options.append(selectinload(Project.tasks).selectinload(Task.assignees))
+        return options
+
+    @staticmethod
+    def get_tree(project_id, expand=None):
+        return Project.query.options(*Project.get_tree_options(expand)).get(project_id)
+
+    @staticmethod
+    def get_tree_version(project_id):
+        # ETag of the project with its tasks, comments and assignees, computed
+        # without loading the objects. Returns None if the project doesn't exist.
+        project_rows = db.session.query(Project.id, Project.created_at, Project.updated_at) \
+            .filter(Project.id == project_id).all()
+        if not project_rows:
+            return None
+        return make_version(project_rows, *Task.get_version_rows(Task.project_id == project_id))
 
     @staticmethod
     def get_all():
-        return Project.query.all()
+        return Project.query.options(*Project.get_tree_options()).all()
+
+    @staticmethod
+    def get_page(limit, cursor=None, expand=None):
+        query = Project.query.options(*Project.get_tree_options(expand))
+        return paginate(query, Project.id, limit, cursor)
+
+    @staticmethod
+    def get_page_version(limit, cursor=None, expand=None):
+        # ETag of the same page as get_page, computed from the key columns of its
+        # projects and the expanded tasks without loading the objects
+        if expand is None:
+            expand = {'tasks', 'tasks.comments', 'tasks.assignees'}
+        project_query = db.session.query(Project.id, Project.created_at, Project.updated_at)
+        project_rows, next_cursor = paginate(project_query, Project.id, limit, cursor)
+        row_groups = [project_rows, [(next_cursor,)]]
+        if 'tasks' in expand and project_rows:
+            project_ids = [row.id for row in project_rows]
+            row_groups.extend(Task.get_version_rows(Task.project_id.in_(project_ids), 'tasks.assignees' in expand))
+        return make_version(*row_groups)
+
+    @staticmethod
+    def get_summary_page(limit, cursor=None, now=None):
+        # Task progress of projects aggregated with one GROUP BY over the tasks.
+        # Projects without tasks are included with zero counts.
+        now = now or datetime.utcnow()
+        is_open = Task.completed == False
+        query = db.session.query(
+            Project.id,
+            Project.name,
+            Project.completed,
+            db.func.count(Task.id).label('tasks'),
+            db.func.count(db.case([(Task.completed == True, Task.id)])).label('completed_tasks'),
+            db.func.count(db.case([(db.and_(is_open, Task.planned_complete_date < now), Task.id)])) \
+                .label('overdue_tasks'),
+            db.func.min(db.case([(db.and_(is_open, Task.planned_complete_date >= now), Task.planned_complete_date)])) \
+                .label('next_planned_complete_date')
+        ).outerjoin(Task, Task.project_id == Project.id).group_by(Project.id, Project.name, Project.completed)
+        summaries, next_cursor = paginate(query, Project.id, limit, cursor)
+        return [summary._asdict() for summary in summaries], next_cursor
 
     def __repr__(self):
         return f'<Project {self.name} | {self.description} | created {self.created_at} | {self.completed} | completed {self.completed_at}>'
@@ -55,12 +154,16 @@ class Task(db.Model):
     completed_at = db.Column(db.DateTime)
 
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_task_project_id_completed', 'project_id', 'completed'),
+        db.Index('ix_task_planned_complete_date', 'planned_complete_date'),
+    )
     
-    comments = db.relationship('Comment', backref='task', lazy='dynamic')
+    comments = db.relationship('Comment', backref='task')
     assignees = db.relationship('User',
         secondary=assignees_for_tasks,
-        backref=db.backref('tasks', lazy='dynamic'),
-        lazy='dynamic'
+        backref=db.backref('tasks', lazy='dynamic')
         )
 
     def save(self):
@@ -69,9 +172,162 @@ class Task(db.Model):
     def delete(self):
         db.session.delete(self)
 
+    @staticmethod
+    def get_tree_options(expand=None):
+        if expand is None:
+            expand = {'comments', 'assignees'}
+        options = []
+        if 'comments' in expand:
+            options.append(selectinload(Task.comments))
+        if 'assignees' in expand:
+            options.append(selectinload(Task.assignees))
+        return options
+
+    @staticmethod
+    def get_tree(task_id, expand=None):
+        return Task.query.options(*Task.get_tree_options(expand)).get(task_id)
+
+    @staticmethod
+    def get_tree_version(task_id):
+        task_rows = db.session.query(Task.id, Task.created_at, Task.updated_at) \
+            .filter(Task.id == task_id).all()
+        if not task_rows:
+            return None
+        comment_rows = db.session.query(Comment.id, Comment.created_at, Comment.updated_at) \
+            .filter(Comment.task_id == task_id).order_by(Comment.id).all()
+        assignee_rows = db.session.query(assignees_for_tasks.c.assignee_id) \
+            .filter(assignees_for_tasks.c.task_id == task_id) \
+            .order_by(assignees_for_tasks.c.assignee_id).all()
+        return make_version(task_rows, comment_rows, assignee_rows)
+
+    @staticmethod
+    def get_version_rows(predicate, assignees=True):
+        # Key rows of the tasks matching the predicate and of their comments,
+        # which are also counted in comment_count, and assignees
+        task_rows = db.session.query(Task.id, Task.project_id, Task.created_at, Task.updated_at) \
+            .filter(predicate).order_by(Task.id).all()
+        row_groups = [task_rows, Task.get_comment_version_rows(predicate)]
+        if assignees:
+            row_groups.append(Task.get_assignee_version_rows(predicate))
+        return row_groups
+
+    @staticmethod
+    def get_comment_version_rows(predicate):
+        return db.session.query(Comment.id, Comment.task_id, Comment.created_at, Comment.updated_at) \
+            .join(Task, Comment.task_id == Task.id) \
+            .filter(predicate).order_by(Comment.id).all()
+
+    @staticmethod
+    def get_assignee_version_rows(predicate):
+        return db.session.query(assignees_for_tasks.c.task_id, assignees_for_tasks.c.assignee_id) \
+            .join(Task, assignees_for_tasks.c.task_id == Task.id) \
+            .filter(predicate) \
+            .order_by(assignees_for_tasks.c.task_id, assignees_for_tasks.c.assignee_id).all()
+
+    @staticmethod
+    def get_counts(task_id):
+        # Same as Project.get_counts, returns None if the task doesn't exist
+        task_comments = db.session.query(db.func.count(Comment.id)).filter(Comment.task_id == task_id)
+        task_assignees = db.session.query(db.func.count(assignees_for_tasks.c.assignee_id)) \
+            .filter(assignees_for_tasks.c.task_id == task_id)
+        counts = db.session.query(
+            Task.query.filter(Task.id == task_id).exists().label('found'),
+            task_comments.label('comments'),
+            task_assignees.label('assignees')
+        ).one()
+        if not counts.found:
+            return None
+        return {
+            'comments': counts.comments,
+            'assignees': counts.assignees
+        }
+
     @staticmethod
     def get_all():
-        return Task.query.all()
+        return Task.query.options(*Task.get_tree_options()).all()
+
+    @staticmethod
+    def get_filter_predicates(filters):
+        # Filters are validated values by name, each one is a predicate covered
+        # by an index
+        predicates = []
+        if 'project_id' in filters:
+            predicates.append(Task.project_id == filters['project_id'])
+        if 'completed' in filters:
+            predicates.append(Task.completed == filters['completed'])
+        if 'assignee_id' in filters:
+            assigned_task_ids = db.session.query(assignees_for_tasks.c.task_id) \
+                .filter(assignees_for_tasks.c.assignee_id == filters['assignee_id'])
+            predicates.append(Task.id.in_(assigned_task_ids))
+        if 'due_after' in filters:
+            predicates.append(Task.planned_complete_date >= filters['due_after'])
+        if 'due_before' in filters:
+            predicates.append(Task.planned_complete_date < filters['due_before'])
+        return predicates
+
+    @staticmethod
+    def get_page(limit, cursor=None, filters=None, sort_by='id', descending=False, expand=None):
+        query = Task.query.options(*Task.get_tree_options(expand)) \
+            .filter(*Task.get_filter_predicates(filters or {}))
+        sort_column = None if sort_by == 'id' else getattr(Task, sort_by)
+        return paginate(query, Task.id, limit, cursor, sort_column, descending)
+
+    @staticmethod
+    def get_page_version(limit, cursor=None, filters=None, sort_by='id', descending=False, expand=None):
+        # ETag of the same page as get_page from the key columns of its tasks,
+        # their comments and the expanded assignees
+        if expand is None:
+            expand = {'comments', 'assignees'}
+        columns = [Task.id, Task.created_at, Task.updated_at]
+        sort_column = None if sort_by == 'id' else getattr(Task, sort_by)
+        if sort_by not in ('id', 'created_at', 'updated_at'):
+            # The cursor of the next page is made from the sort column
+            columns.append(sort_column)
+        task_query = db.session.query(*columns).filter(*Task.get_filter_predicates(filters or {}))
+        task_rows, next_cursor = paginate(task_query, Task.id, limit, cursor, sort_column, descending)
+        row_groups = [task_rows, [(next_cursor,)]]
+        if task_rows:
+            page_predicate = Task.id.in_([row.id for row in task_rows])
+            row_groups.append(Task.get_comment_version_rows(page_predicate))
+            if 'assignees' in expand:
+                row_groups.append(Task.get_assignee_version_rows(page_predicate))
+        return make_version(*row_groups)
+
+    @staticmethod
+    def get_project_ids(task_ids):
+        project_ids = db.session.query(Task.project_id).filter(Task.id.in_(task_ids)).distinct().all()
+        return [project_id for (project_id,) in project_ids]
+
+    @staticmethod
+    def patch(task_id, values):
+        # Applies the column values with one UPDATE without loading the task.
+        # Returns id, project_id and the written columns, or None if the task
+        # doesn't exist. completed_at follows update_completed_state: it's set
+        # when the task becomes completed and cleared when it's reopened.
+        now = datetime.utcnow()
+        values = dict(values, updated_at=now)
+        if 'completed' in values:
+            # Right hand side of SET sees the row before the update
+            values['completed_at'] = db.case(
+                [(Task.completed == values['completed'], Task.completed_at)],
+                else_=now if values['completed'] else None
+            )
+        table = Task.__table__
+        returned_columns = [table.c.id, table.c.project_id] + \
+            [table.c[key] for key in values if key not in ('id', 'project_id')]
+        statement = table.update().where(table.c.id == task_id).values(values)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            row = db.session.execute(statement.returning(*returned_columns)).first()
+        else:
+            # No RETURNING before SQLite 3.35, the row is read back in the same transaction
+            row = None
+            if db.session.execute(statement).rowcount:
+                row = db.session.execute(
+                    db.select(returned_columns).where(table.c.id == task_id)
+                ).first()
+        if row is None:
+            return None
+        return dict(row)
 
     def add_assignee(self, assignee):
         self.assignees.append(assignee)
@@ -81,6 +337,39 @@ class Task(db.Model):
         self.assignees.remove(assignee)
         db.session.add(self)
 
+    def has_assignee(self, assignee):
+        # EXISTS query against the unique index, assignees aren't loaded
+        return db.session.query(
+            db.session.query(assignees_for_tasks)
+            .filter(assignees_for_tasks.c.task_id == self.id)
+            .filter(assignees_for_tasks.c.assignee_id == assignee.id)
+            .exists()
+        ).scalar()
+
+    @staticmethod
+    def add_assignees(task_ids, user_ids):
+        # Assigns every user to every task with one INSERT ... SELECT. Pairs that
+        # already exist are skipped by the unique index and IDs that don't exist
+        # aren't in the SELECT. Returns the number of added assignments.
+        pairs = db.select([Task.id, User.id]) \
+            .where(Task.id.in_(task_ids)) \
+            .where(User.id.in_(user_ids))
+        columns = ['task_id', 'assignee_id']
+        if db.session.get_bind().dialect.name == 'postgresql':
+            statement = postgresql.insert(assignees_for_tasks).from_select(columns, pairs) \
+                .on_conflict_do_nothing(index_elements=columns)
+        else:
+            statement = assignees_for_tasks.insert().prefix_with('OR IGNORE').from_select(columns, pairs)
+        return db.session.execute(statement).rowcount
+
+    @staticmethod
+    def remove_assignees(task_ids, user_ids):
+        # Returns the number of removed assignments
+        statement = assignees_for_tasks.delete() \
+            .where(assignees_for_tasks.c.task_id.in_(task_ids)) \
+            .where(assignees_for_tasks.c.assignee_id.in_(user_ids))
+        return db.session.execute(statement).rowcount
+
     def update_completed_state(self, old_task_completed):
         print("Self completed")
         print(self.completed)
@@ -109,10 +398,24 @@ class User(db.Model):
     def delete(self):
         db.session.delete(self)
 
+    def get_task_project_ids(self):
+        task_project_ids = self.tasks.with_entities(Task.project_id).distinct().all()
+        return [project_id for (project_id,) in task_project_ids]
+
     @staticmethod
     def get_all():
         return User.query.all()
 
+    @staticmethod
+    def get_page(limit, cursor=None):
+        return paginate(User.query, User.id, limit, cursor)
+
+    @staticmethod
+    def get_page_version(limit, cursor=None):
+        # Users don't have updated_at, the name is the only other column
+        user_rows, next_cursor = paginate(db.session.query(User.id, User.name), User.id, limit, cursor)
+        return make_version(user_rows, [(next_cursor,)])
+
     def __repr__(self):
         return f'<User {self.name}>'
 
@@ -123,9 +426,13 @@ class Comment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
-    author_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'))
 
+    __table_args__ = (
+        db.Index('ix_comment_task_id_created_at', 'task_id', 'created_at'),
+    )
+
     def save(self):
         db.session.add(self)
 
@@ -136,9 +443,34 @@ class Comment(db.Model):
     def get_all():
         Comment.query.all()
 
+    @staticmethod
+    def get_task_page(task_id, limit, cursor=None):
+        # Oldest first, read in the order of the (task_id, created_at) index.
+        # created_at always has a value, so NULL ordering isn't needed.
+        query = Comment.query.filter(Comment.task_id == task_id)
+        return paginate(query, Comment.id, limit, cursor, Comment.created_at, has_nulls=False)
+
+    @staticmethod
+    def get_task_page_version(task_id, limit, cursor=None):
+        comment_query = db.session.query(Comment.id, Comment.created_at, Comment.updated_at) \
+            .filter(Comment.task_id == task_id)
+        comment_rows, next_cursor = paginate(
+            comment_query, Comment.id, limit, cursor, Comment.created_at, has_nulls=False
+        )
+        return make_version(comment_rows, [(next_cursor,)])
+
     def __repr__(self):
         return f'<Comment {self.content} | Created at {self.created_at} | Updated at {self.updated_at}>'
 
+# Counted with a correlated subquery in the same SELECT as the tasks, served by
+# the (task_id, created_at) index of comments
+Task.comment_count = db.column_property(
+    db.select([db.func.count(Comment.id)])
+    .where(Comment.task_id == Task.id)
+    .correlate_except(Comment)
+    .as_scalar()
+)
+
 # ---------------------------------
 # Marshmallow serialization schemas
 # ---------------------------------
@@ -160,12 +492,20 @@ class UserSchema(SQLAlchemyAutoSchema):
 class TaskSchema(SQLAlchemyAutoSchema):
     comments = Nested(CommentSchema, many=True)
     assignees = Nested(UserSchema, many=True)
+    comment_count = fields.Integer(dump_only=True)
     class Meta:
         model = Task
         include_fk = True
         load_instance = True
         sqla_session = db.session
 
+    @pre_load
+    def remove_comment_count(self, data, **kwargs):
+        # Clients send back the tasks they got, the computed count isn't loaded
+        if isinstance(data, dict) and 'comment_count' in data:
+            data = {key: value for key, value in data.items() if key != 'comment_count'}
+        return data
+
 class ProjectSchema(SQLAlchemyAutoSchema):
     tasks = Nested(TaskSchema, many=True)
     class Meta:
@@ -0,0 +1,60 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app
+
+# orjson is used when it's installed, otherwise the standard library encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+class StdlibJSONEncoder(object):
+    name = 'json'
+
+    def encode(self, obj, compact=True):
+        if compact:
+            return json.dumps(obj, separators=(',', ':'), default=_default).encode('utf-8')
+        return json.dumps(obj, indent=2, default=_default).encode('utf-8') + b'\n'
+
+class OrjsonEncoder(object):
+    # Encodes datetimes natively and is many times faster than the standard library
+    name = 'orjson'
+
+    def encode(self, obj, compact=True):
+        if compact:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2) + b'\n'
+
+def create_json_encoder(encoder_name):
+    if encoder_name == 'auto':
+        encoder_name = 'orjson' if orjson is not None else 'json'
+    if encoder_name == 'orjson':
+        if orjson is None:
+            raise ValueError('JSON_ENCODER is orjson but orjson is not installed')
+        return OrjsonEncoder()
+    elif encoder_name == 'json':
+        return StdlibJSONEncoder()
+    raise ValueError(f'Unknown JSON_ENCODER {encoder_name}')
+
+def encode_json(obj, compact=None):
+    if compact is None:
+        compact = current_app.config['JSON_COMPACT']
+    encoder = current_app.extensions['json_encoder']
+    return encoder.encode(obj, compact=compact)
+
+def make_json_response(response_object, status_code):
+    # Serializes the response exactly once with the configured encoder
+    return current_app.response_class(
+        encode_json(response_object),
+        status=status_code,
+        mimetype='application/json'
+    )
@@ -1,6 +1,16 @@
-from flask import make_response, jsonify, request
+from flask import make_response, request, Response, stream_with_context
+from functools import lru_cache
+import os
 import traceback
-from api import app, db
+from datetime import datetime, timezone
+from api import app, db, project_cache
+from api.database import get_pool_stats
+from api.export import export_records
+from api.instrumentation import slow_query_log
+from api.metrics import generate_metrics
+from api.responses import make_json_response
+from api.search import is_search_supported, search, search_types
+from api.utilities import decode_cursor, make_version
 from api.models import (
     Project, ProjectSchema,
     Task, TaskSchema,
@@ -20,10 +30,185 @@ tasks_schema = TaskSchema(many=True)
 user_schema = UserSchema()
 users_schema = UserSchema(many=True)
 
+comments_schema = CommentSchema(many=True)
+
+# Bulk endpoints create new transient objects, IDs are given by the database
+bulk_tasks_schema = TaskSchema(many=True, transient=True, exclude=('comments', 'assignees'), dump_only=('id',))
+bulk_users_schema = UserSchema(many=True, transient=True, dump_only=('id',))
+bulk_comments_schema = CommentSchema(many=True, transient=True, dump_only=('id',))
+
+# Fields that PATCH can change, others are rejected as unknown
+patch_task_schema = TaskSchema(
+    only=('name', 'completed', 'planned_complete_date', 'project_id'),
+    partial=True,
+    transient=True
+)
+
 # Status message descriptions
 status_msg_fail = 'fail'
 status_msg_success = 'success'
 
+def get_pagination_args():
+    # Raises ValueError when limit or cursor query parameters are invalid
+    limit = request.args.get('limit', app.config['PAGINATION_DEFAULT_LIMIT'])
+    limit = int(limit)
+    if limit < 1 or limit > app.config['PAGINATION_MAX_LIMIT']:
+        raise ValueError(f'Limit must be between 1 and {app.config["PAGINATION_MAX_LIMIT"]}')
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+    else:
+        cursor = None
+    return limit, cursor
+
+# Nested relationships that can be expanded and the ones expanded by default.
+# Comments are left out by default, they're paginated by /api/task/<id>/comments.
+project_expansions = ['tasks', 'tasks.comments', 'tasks.assignees']
+default_project_expansions = ['tasks', 'tasks.assignees']
+task_expansions = ['comments', 'assignees']
+default_task_expansions = ['assignees']
+
+@lru_cache(maxsize=256)
+def get_trimmed_schema(schema_class, many, only, exclude):
+    # Schema instances are built once per field combination. Raises ValueError
+    # for unknown fields.
+    return schema_class(many=many, only=only, exclude=exclude)
+
+def get_representation_args(schema_class, expansions, default_expansions, many=False):
+    # Returns the schema for fields and expand query parameters, the relationships
+    # to load and the representation key, which is None for the default
+    # representation. Raises ValueError for invalid values.
+    fields = request.args.get('fields')
+    only = tuple(sorted(set(fields.split(',')))) if fields else None
+    expand = request.args.get('expand')
+    if expand is None:
+        expanded = set(default_expansions)
+    else:
+        expanded = {name for name in expand.split(',') if name}
+        if not expanded.issubset(expansions):
+            raise ValueError(f'Invalid expand {expand}')
+        # Expanding nested relationship expands its parent too
+        expanded |= {name.split('.')[0] for name in expanded}
+    if only is not None:
+        # Relationships are kept when they're selected, are under selected one
+        # or have selected fields, like tasks for tasks.name
+        expanded = {
+            name for name in expanded
+            if any(field == name or name.startswith(f'{field}.') or field.startswith(f'{name}.') for field in only)
+        }
+        # Relationships that aren't expanded would be dropped from the response
+        for field in only:
+            for name in expansions:
+                if (field == name or field.startswith(f'{name}.')) and name not in expanded:
+                    raise ValueError(f'Field {field} is not expanded')
+    # Excluding the parent excludes its nested relationships too
+    exclude = tuple(
+        name for name in expansions
+        if name not in expanded and (name.split('.')[0] in expanded or '.' not in name)
+    )
+    schema = get_trimmed_schema(schema_class, many, only, exclude)
+    representation = None
+    if fields or expand is not None:
+        representation = (only, exclude)
+    return schema, expanded, representation
+
+def get_representation_version(etag, representation):
+    # Other than default representations of the same object need their own ETags
+    if representation is None:
+        return etag
+    return make_version([(etag, *representation)])
+
+# Task list sort options, prefixed with - for descending order
+task_sort_columns = ['id', 'name', 'created_at', 'planned_complete_date', 'completed_at']
+
+def parse_datetime_arg(value):
+    # Naive datetimes are UTC like the stored ones
+    parsed_datetime = datetime.fromisoformat(value)
+    if parsed_datetime.tzinfo is not None:
+        parsed_datetime = parsed_datetime.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed_datetime
+
+def get_task_filter_args(default_sort='id'):
+    # Raises ValueError when filter or sort query parameters are invalid
+    filters = {}
+    completed = request.args.get('completed')
+    if completed is not None:
+        if completed.lower() not in ('true', 'false'):
+            raise ValueError(f'Invalid completed value {completed}')
+        filters['completed'] = completed.lower() == 'true'
+    for name in ['project_id', 'assignee_id']:
+        if name in request.args:
+            filters[name] = int(request.args[name])
+    for name in ['due_after', 'due_before']:
+        if name in request.args:
+            filters[name] = parse_datetime_arg(request.args[name])
+    sort = request.args.get('sort', default_sort)
+    sort_by = sort[1:] if sort.startswith('-') else sort
+    if sort_by not in task_sort_columns:
+        raise ValueError(f'Invalid sort {sort}')
+    return filters, sort_by, sort.startswith('-')
+
+def validate_bulk_items(schema, items, references=None):
+    # Validates all items in one pass and returns errors by item index. References
+    # are foreign key fields and their models, checked with one query per field.
+    if not isinstance(items, list) or len(items) == 0:
+        raise ValueError('Bulk request data must be non-empty list')
+    if len(items) > app.config['BULK_MAX_ITEMS']:
+        raise ValueError(f'Bulk request can contain at most {app.config["BULK_MAX_ITEMS"]} items')
+    errors = schema.validate(items)
+    valid_items = [(index, item) for index, item in enumerate(items) if index not in errors]
+    for field, model in (references or {}).items():
+        referenced_ids = {item[field] for index, item in valid_items if item.get(field) is not None}
+        existing_ids = set()
+        if referenced_ids:
+            existing_rows = db.session.query(model.id).filter(model.id.in_(referenced_ids)).all()
+            existing_ids = {model_id for (model_id,) in existing_rows}
+        for index, item in valid_items:
+            if item.get(field) is not None and item[field] not in existing_ids:
+                errors.setdefault(index, {})[field] = [f'{model.__name__} {item[field]} not found']
+    return errors
+
+def get_assignment_args(request_data):
+    # Returns task and user ID lists of bulk assignment. Raises ValueError when
+    # they aren't non-empty lists of integers or there are too many pairs.
+    if not isinstance(request_data, dict):
+        raise ValueError('Assignment request data must be object')
+    ids = []
+    for key in ['task_ids', 'user_ids']:
+        key_ids = request_data.get(key)
+        if not isinstance(key_ids, list) or len(key_ids) == 0 \
+                or not all(isinstance(key_id, int) and not isinstance(key_id, bool) for key_id in key_ids):
+            raise ValueError(f'{key} must be non-empty list of IDs')
+        ids.append(sorted(set(key_ids)))
+    task_ids, user_ids = ids
+    if len(task_ids) * len(user_ids) > app.config['BULK_MAX_ITEMS']:
+        raise ValueError(f'Assignment request can contain at most {app.config["BULK_MAX_ITEMS"]} pairs')
+    return task_ids, user_ids
+
+def get_missing_ids(model, ids):
+    existing_rows = db.session.query(model.id).filter(model.id.in_(ids)).all()
+    existing_ids = {model_id for (model_id,) in existing_rows}
+    return [model_id for model_id in ids if model_id not in existing_ids]
+
+def make_bulk_errors(errors):
+    return [{'index': index, 'errors': errors[index]} for index in sorted(errors)]
+
+def is_not_modified(etag):
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+def add_validators(response, etag):
+    response.set_etag(etag)
+    # Clients may store the response but have to revalidate it on every use
+    response.cache_control.no_cache = True
+    return response
+
+def make_conditional_response(response):
+    # Used for responses that don't have cheaper validator than the body itself.
+    # The body is built and hashed before the conditional request is answered.
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @app.route('/api/project', methods=['POST'])
 def add_project():
     response_object = {'status': status_msg_success}
@@ -34,36 +219,66 @@ def add_project():
         db.session.commit()
         response_object['project'] = project_schema.dump(project)
         response_object['message'] = 'Project added succesfully!'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 200)
+        return make_json_response(response_object, 200)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to add project'
         db.session.rollback()
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
 
 @app.route('/api/project/<int:project_id>', methods=['GET'])
 def get_project(project_id):
     response_object = {'status': status_msg_success}
-    project = Project.query.get(project_id)
     try:
-        if project:
-            project_json = project_schema.dump(project)
+        schema, expand, representation = get_representation_args(ProjectSchema, project_expansions, default_project_expansions)
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid fields or expand parameters'
+        return make_json_response(response_object, 400)
+    project_etag = Project.get_tree_version(project_id)
+    if project_etag:
+        project_etag = get_representation_version(project_etag, representation)
+    if project_etag and is_not_modified(project_etag):
+        return add_validators(make_response('', 304), project_etag)
+    try:
+        if project_etag:
+            # Only the default representation is cached
+            project_json = None
+            if representation is None:
+                project_json = project_cache.get(project_id, project_etag)
+            if project_json is None:
+                project_json = schema.dump(Project.get_tree(project_id, expand))
+                if representation is None:
+                    project_cache.set(project_id, project_etag, project_json)
             response_object['project'] = project_json
             response_object['message'] = 'Project queried successfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
-        elif project == None:
+            return add_validators(make_json_response(response_object, 200), project_etag)
+        else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Queried project was not found'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to fetch project'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/project/<int:project_id>/counts', methods=['GET'])
+def get_project_counts(project_id):
+    response_object = {'status': status_msg_success}
+    try:
+        counts = Project.get_counts(project_id)
+        if counts is not None:
+            response_object['counts'] = counts
+            response_object['message'] = 'Project counts queried successfully!'
+            return make_json_response(response_object, 200)
+        else:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Queried project was not found'
+            return make_json_response(response_object, 404)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to fetch project counts'
+        return make_json_response(response_object, 400)
 
 @app.route('/api/project/<int:project_id>', methods=['DELETE'])
 def delete_project(project_id):
@@ -74,38 +289,98 @@ def delete_project(project_id):
             if project.has_tasks():
                 response_object['status'] = status_msg_fail
                 response_object['message'] = 'Projects contains related tasks, unable to delete'
-                json_response = jsonify(response_object)
-                return make_response(json_response, 400)
+                return make_json_response(response_object, 400)
             project.delete()
             db.session.commit()
+            project_cache.invalidate(project_id)
             response_object['message'] = 'Project deleted succesfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return make_json_response(response_object, 200)
         else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Project not found'
-            return make_response(jsonify(response_object), 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to delete project'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
 
 @app.route('/api/projects', methods=['GET'])
 def get_all_projects():
     response_object = {'status': status_msg_success}
     try:
-        all_projects = Project.get_all()
-        all_projects_json = projects_schema.dump(all_projects)
+        limit, cursor = get_pagination_args()
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    try:
+        schema, expand, representation = get_representation_args(ProjectSchema, project_expansions, default_project_expansions, many=True)
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid fields or expand parameters'
+        return make_json_response(response_object, 400)
+    try:
+        page_etag = get_representation_version(Project.get_page_version(limit, cursor, expand), representation)
+        if is_not_modified(page_etag):
+            return add_validators(make_response('', 304), page_etag)
+        all_projects, next_cursor = Project.get_page(limit, cursor, expand)
+        all_projects_json = schema.dump(all_projects)
         response_object['projects'] = all_projects_json
+        response_object['next_cursor'] = next_cursor
         response_object['message'] = 'Projects queried succesfully!'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 200)
+        return add_validators(make_json_response(response_object, 200), page_etag)
+    except ValueError as e:
+        # Cursor of another list
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to fetch projects'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/projects/summary', methods=['GET'])
+def get_projects_summary():
+    response_object = {'status': status_msg_success}
+    try:
+        limit, cursor = get_pagination_args()
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    try:
+        summaries, next_cursor = Project.get_summary_page(limit, cursor)
+        response_object['projects'] = summaries
+        response_object['next_cursor'] = next_cursor
+        response_object['message'] = 'Project summaries queried succesfully!'
+        # Overdue counts change with time without any row changing, so the
+        # summaries themselves are the validator
+        return make_conditional_response(make_json_response(response_object, 200))
+    except ValueError as e:
+        # Cursor of another list
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to fetch project summaries'
+        return make_json_response(response_object, 400)
+
+@app.route('/api/project/<int:project_id>/export', methods=['GET'])
+def export_project(project_id):
+    response_object = {'status': status_msg_success}
+    if Project.query.get(project_id) is None:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Exported project was not found'
+        return make_json_response(response_object, 404)
+    # Records are written to the client while they are read from the database
+    export_lines = stream_with_context(export_records(project_id))
+    return Response(export_lines, mimetype='application/x-ndjson')
+
+@app.route('/api/export', methods=['GET'])
+def export_all():
+    export_lines = stream_with_context(export_records())
+    return Response(export_lines, mimetype='application/x-ndjson')
 
 @app.route('/api/task', methods=['POST'])
 def add_task():
@@ -115,38 +390,121 @@ def add_task():
         task = task_schema.load(request_data)
         task.save()
         db.session.commit()
+        project_cache.invalidate(task.project_id)
         response_object['task'] = task_schema.dump(task)
         response_object['message'] = 'Task added successfully!'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 200)
+        return make_json_response(response_object, 200)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to add task'
         db.session.rollback()
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/tasks/bulk', methods=['POST'])
+def add_tasks_bulk():
+    response_object = {'status': status_msg_success}
+    try:
+        request_data = request.get_json()
+        errors = validate_bulk_items(bulk_tasks_schema, request_data, {'project_id': Project})
+        if errors:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Some of the tasks were invalid, no tasks were added'
+            response_object['errors'] = make_bulk_errors(errors)
+            return make_json_response(response_object, 400)
+        tasks = bulk_tasks_schema.load(request_data)
+        # Inserted in batches within one transaction
+        db.session.bulk_save_objects(tasks)
+        db.session.commit()
+        project_cache.invalidate(*[task.project_id for task in tasks])
+        response_object['created'] = len(tasks)
+        response_object['message'] = 'Tasks added successfully!'
+        return make_json_response(response_object, 200)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to add tasks'
+        db.session.rollback()
+        return make_json_response(response_object, 400)
 
 @app.route('/api/task/<int:task_id>', methods=['GET'])
 def get_task(task_id):
     response_object = {'status': status_msg_success}
-    task = Task.query.get(task_id)
+    try:
+        schema, expand, representation = get_representation_args(TaskSchema, task_expansions, default_task_expansions)
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid fields or expand parameters'
+        return make_json_response(response_object, 400)
+    task_etag = Task.get_tree_version(task_id)
+    if task_etag:
+        task_etag = get_representation_version(task_etag, representation)
+    if task_etag and is_not_modified(task_etag):
+        return add_validators(make_response('', 304), task_etag)
+    task = Task.get_tree(task_id, expand)
     try:
         if task:
-            task_json = task_schema.dump(task)
+            task_json = schema.dump(task)
             response_object['task'] = task_json
             response_object['message'] = 'Task queried successfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return add_validators(make_json_response(response_object, 200), task_etag)
         elif task == None:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Queried task was not found'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to fetch task'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/task/<int:task_id>/counts', methods=['GET'])
+def get_task_counts(task_id):
+    response_object = {'status': status_msg_success}
+    try:
+        counts = Task.get_counts(task_id)
+        if counts is not None:
+            response_object['counts'] = counts
+            response_object['message'] = 'Task counts queried successfully!'
+            return make_json_response(response_object, 200)
+        else:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Queried task was not found'
+            return make_json_response(response_object, 404)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to fetch task counts'
+        return make_json_response(response_object, 400)
+
+@app.route('/api/task/<int:task_id>/comments', methods=['GET'])
+def get_task_comments(task_id):
+    response_object = {'status': status_msg_success}
+    try:
+        limit, cursor = get_pagination_args()
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    task_exists = db.session.query(Task.query.filter(Task.id == task_id).exists()).scalar()
+    if not task_exists:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Queried task was not found'
+        return make_json_response(response_object, 404)
+    try:
+        page_etag = Comment.get_task_page_version(task_id, limit, cursor)
+        if is_not_modified(page_etag):
+            return add_validators(make_response('', 304), page_etag)
+        comments, next_cursor = Comment.get_task_page(task_id, limit, cursor)
+        response_object['comments'] = comments_schema.dump(comments)
+        response_object['next_cursor'] = next_cursor
+        response_object['message'] = 'Comments queried successfully!'
+        return add_validators(make_json_response(response_object, 200), page_etag)
+    except ValueError as e:
+        # Cursor of another list
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to fetch comments'
+        return make_json_response(response_object, 400)
 
 @app.route('/api/task/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
@@ -154,36 +512,69 @@ def delete_task(task_id):
     task = Task.query.get(task_id)
     try:
         if task:
+            project_id = task.project_id
             task.delete()
             db.session.commit()
+            project_cache.invalidate(project_id)
             response_object['message'] = 'Tasks deleted succesfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return make_json_response(response_object, 200)
         else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Task not found'
-            return make_response(jsonify(response_object), 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to delete task'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
 
-@app.route('/api/tasks', methods=['GET'])
-def get_all_tasks():
-    response_object = {'status': status_msg_success}
+def make_task_list_response(response_object, fixed_filters=None, default_sort='id'):
+    # Paginated, filtered and sorted task list. Fixed filters come from the URL
+    # and override the query parameters.
     try:
-        all_tasks = Task.get_all()
-        all_tasks_json = tasks_schema.dump(all_tasks)
+        limit, cursor = get_pagination_args()
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    try:
+        filters, sort_by, descending = get_task_filter_args(default_sort)
+        filters.update(fixed_filters or {})
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid filter parameters'
+        return make_json_response(response_object, 400)
+    try:
+        schema, expand, representation = get_representation_args(TaskSchema, task_expansions, default_task_expansions, many=True)
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid fields or expand parameters'
+        return make_json_response(response_object, 400)
+    try:
+        page_etag = get_representation_version(
+            Task.get_page_version(limit, cursor, filters, sort_by, descending, expand), representation
+        )
+        if is_not_modified(page_etag):
+            return add_validators(make_response('', 304), page_etag)
+        all_tasks, next_cursor = Task.get_page(limit, cursor, filters, sort_by, descending, expand)
+        all_tasks_json = schema.dump(all_tasks)
         response_object['tasks'] = all_tasks_json
+        response_object['next_cursor'] = next_cursor
         response_object['message'] = 'Tasks queried succesfully!'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 200)
+        return add_validators(make_json_response(response_object, 200), page_etag)
+    except ValueError as e:
+        # Cursor from a different sort order
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to fetch tasks'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/tasks', methods=['GET'])
+def get_all_tasks():
+    response_object = {'status': status_msg_success}
+    return make_task_list_response(response_object)
 
 @app.route('/api/task/add_assignee', methods=['POST'])
 def add_assignee_to_task():
@@ -196,27 +587,75 @@ def add_assignee_to_task():
         task = Task.query.get(task.id)
         assignee = User.query.get(assignee.id)
         if task:
-            task_assignees = task.assignees.all()
-            if assignee and (assignee in task_assignees):
+            if assignee and task.has_assignee(assignee):
                 response_object['status'] = status_msg_fail
                 response_object['message'] = 'Assignee already assigned to this task'
-                json_response = jsonify(response_object)
-                return make_response(json_response, 400)
+                return make_json_response(response_object, 400)
             task.add_assignee(assignee)
             db.session.commit()
+            project_cache.invalidate(task.project_id)
             response_object['task'] = task_schema.dump(task)
             response_object['message'] = 'Assignee added successfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return make_json_response(response_object, 200)
         else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Task that assignee was tried to be added to wasn\'t found'
-            return make_response(jsonify(response_object), 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to add assignee to task'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/tasks/add_assignees', methods=['POST'])
+def add_assignees_to_tasks():
+    response_object = {'status': status_msg_success}
+    try:
+        task_ids, user_ids = get_assignment_args(request.get_json())
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = str(e)
+        return make_json_response(response_object, 400)
+    try:
+        missing_task_ids = get_missing_ids(Task, task_ids)
+        missing_user_ids = get_missing_ids(User, user_ids)
+        if missing_task_ids or missing_user_ids:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Some of the tasks or users weren\'t found, no assignees were added'
+            response_object['errors'] = {'task_ids': missing_task_ids, 'user_ids': missing_user_ids}
+            return make_json_response(response_object, 404)
+        added = Task.add_assignees(task_ids, user_ids)
+        db.session.commit()
+        project_cache.invalidate(*Task.get_project_ids(task_ids))
+        response_object['added'] = added
+        response_object['message'] = 'Assignees added successfully!'
+        return make_json_response(response_object, 200)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to add assignees to tasks'
+        db.session.rollback()
+        return make_json_response(response_object, 400)
+
+@app.route('/api/tasks/remove_assignees', methods=['POST'])
+def remove_assignees_from_tasks():
+    response_object = {'status': status_msg_success}
+    try:
+        task_ids, user_ids = get_assignment_args(request.get_json())
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = str(e)
+        return make_json_response(response_object, 400)
+    try:
+        removed = Task.remove_assignees(task_ids, user_ids)
+        db.session.commit()
+        project_cache.invalidate(*Task.get_project_ids(task_ids))
+        response_object['removed'] = removed
+        response_object['message'] = 'Assignees removed successfully!'
+        return make_json_response(response_object, 200)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to remove assignees from tasks'
+        db.session.rollback()
+        return make_json_response(response_object, 400)
 
 @app.route('/api/task/<int:task_id>', methods=['PUT'])
 def update_task(task_id):
@@ -228,25 +667,70 @@ def update_task(task_id):
             # Saving the DB status to variable because loading touches the DB entry and makes
             # the session dirty
             task_complete_status = task.completed
+            task_project_id = task.project_id
             request_task = task_schema.load(request_data)
             request_task = request_task.update_completed_state(task_complete_status)
+            # Request contains the previous updated_at which would otherwise be written
+            # over the onupdate timestamp
+            request_task.updated_at = datetime.utcnow()
             request_task.save()
             db.session.commit()
+            project_cache.invalidate(task_project_id, request_task.project_id)
             response_object['task'] = task_schema.dump(request_task)
             response_object['message'] = 'Task updated successfully!'
-            json_response = jsonify(response_object)
-            return make_response(jsonify(response_object), 200)
+            return make_json_response(response_object, 200)
         else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Task not found'
-            json_response = jsonify(response_object)
-            return make_response(jsonify(response_object), 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         traceback.print_exc()
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to update task'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/task/<int:task_id>', methods=['PATCH'])
+def patch_task(task_id):
+    response_object = {'status': status_msg_success}
+    request_data = request.get_json(silent=True)
+    errors = {'_schema': ['Request data must be non-empty object']}
+    if isinstance(request_data, dict) and set(request_data) - {'comment_count'}:
+        errors = patch_task_schema.validate(request_data)
+    if not errors and 'project_id' in request_data:
+        project_exists = db.session.query(
+            Project.query.filter(Project.id == request_data['project_id']).exists()
+        ).scalar()
+        if not project_exists:
+            errors = {'project_id': [f'Project {request_data["project_id"]} not found']}
+    if errors:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid task data'
+        response_object['errors'] = errors
+        return make_json_response(response_object, 400)
+    try:
+        # Loading a transient task deserializes the values without touching the session
+        request_task = patch_task_schema.load(request_data)
+        patch_values = {key: getattr(request_task, key) for key in request_data if key in patch_task_schema.fields}
+        previous_project_ids = []
+        if 'project_id' in patch_values:
+            previous_project_ids = Task.get_project_ids([task_id])
+        patched_task = Task.patch(task_id, patch_values)
+        if patched_task:
+            db.session.commit()
+            project_cache.invalidate(patched_task['project_id'], *previous_project_ids)
+            patched_task_schema = get_trimmed_schema(TaskSchema, False, tuple(sorted(patched_task)), ())
+            response_object['task'] = patched_task_schema.dump(patched_task)
+            response_object['message'] = 'Task updated successfully!'
+            return make_json_response(response_object, 200)
+        else:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Task not found'
+            return make_json_response(response_object, 404)
+    except Exception as e:
+        db.session.rollback()
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to update task'
+        return make_json_response(response_object, 400)
 
 @app.route('/api/task/remove_assignee', methods=['POST'])
 def remove_assignee_from_task():
@@ -259,19 +743,18 @@ def remove_assignee_from_task():
         if task:
             task.remove_assignee(assignee)
             db.session.commit()
+            project_cache.invalidate(task.project_id)
             response_object['task'] = task_schema.dump(task)
             response_object['message'] = 'Assignee removed successfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return make_json_response(response_object, 200)
         else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Task that assignee was tried to be removed from wasn\'t found'
-            return make_response(jsonify(response_object), 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to remove assignee from task'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
 
 @app.route('/api/user', methods=['POST'])
 def add_user():
@@ -281,22 +764,45 @@ def add_user():
         if request_data['name'] == '':
             response_object['status'] = status_msg_fail
             response_object['message'] = 'User name can\'t be empty'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 400)
+            return make_json_response(response_object, 400)
         user = user_schema.load(request_data)
         user.save()
         db.session.commit()
         response_object['user'] = user_schema.dump(user)
         response_object['message'] = 'User added succesfully!'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 200)
+        return make_json_response(response_object, 200)
     except Exception as e:
         traceback.print_exc()
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to add user'
         db.session.rollback()
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/users/bulk', methods=['POST'])
+def add_users_bulk():
+    response_object = {'status': status_msg_success}
+    try:
+        request_data = request.get_json()
+        errors = validate_bulk_items(bulk_users_schema, request_data)
+        for index, user in enumerate(request_data):
+            if index not in errors and user.get('name') == '':
+                errors[index] = {'name': ['User name can\'t be empty']}
+        if errors:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Some of the users were invalid, no users were added'
+            response_object['errors'] = make_bulk_errors(errors)
+            return make_json_response(response_object, 400)
+        users = bulk_users_schema.load(request_data)
+        db.session.bulk_save_objects(users)
+        db.session.commit()
+        response_object['created'] = len(users)
+        response_object['message'] = 'Users added successfully!'
+        return make_json_response(response_object, 200)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to add users'
+        db.session.rollback()
+        return make_json_response(response_object, 400)
 
 @app.route('/api/user/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -307,18 +813,26 @@ def get_user(user_id):
             user_json = user_schema.dump(user)
             response_object['user'] = user_json
             response_object['message'] = 'User queried successfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return make_json_response(response_object, 200)
         elif user == None:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'Queried user was not found'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to fetch user'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
+
+@app.route('/api/user/<int:user_id>/tasks', methods=['GET'])
+def get_user_tasks(user_id):
+    # Tasks assigned to the user, by default the ones due first on top
+    response_object = {'status': status_msg_success}
+    user_exists = db.session.query(User.query.filter(User.id == user_id).exists()).scalar()
+    if not user_exists:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'User not found'
+        return make_json_response(response_object, 404)
+    return make_task_list_response(response_object, {'assignee_id': user_id}, 'planned_complete_date')
 
 @app.route('/api/user/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
@@ -326,33 +840,147 @@ def delete_user(user_id):
     user = User.query.get(user_id)
     try:
         if user:
+            # Deleting the user removes it from the assignees of these projects' tasks
+            user_project_ids = user.get_task_project_ids()
             user.delete()
             db.session.commit()
+            project_cache.invalidate(*user_project_ids)
             response_object['message'] = 'User deleted succesfully!'
-            json_response = jsonify(response_object)
-            return make_response(json_response, 200)
+            return make_json_response(response_object, 200)
         else:
             response_object['status'] = status_msg_fail
             response_object['message'] = 'User not found'
-            return make_response(jsonify(response_object), 404)
+            return make_json_response(response_object, 404)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to delete user'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
+        return make_json_response(response_object, 400)
 
 @app.route('/api/users', methods=['GET'])
 def get_all_user():
     response_object = {'status': status_msg_success}
     try:
-        all_users = User.get_all()
+        limit, cursor = get_pagination_args()
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
+    try:
+        page_etag = User.get_page_version(limit, cursor)
+        if is_not_modified(page_etag):
+            return add_validators(make_response('', 304), page_etag)
+        all_users, next_cursor = User.get_page(limit, cursor)
         all_user_json = users_schema.dump(all_users)
         response_object['users'] = all_user_json
+        response_object['next_cursor'] = next_cursor
         response_object['message'] = 'Users queried succesfully!'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 200)
+        return add_validators(make_json_response(response_object, 200), page_etag)
+    except ValueError as e:
+        # Cursor of another list
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid pagination parameters'
+        return make_json_response(response_object, 400)
     except Exception as e:
         response_object['status'] = status_msg_fail
         response_object['message'] = 'Something went wrong when trying to fetch user'
-        json_response = jsonify(response_object)
-        return make_response(json_response, 400)
\ No newline at end of file
+        return make_json_response(response_object, 400)
+
+@app.route('/api/comments/bulk', methods=['POST'])
+def add_comments_bulk():
+    response_object = {'status': status_msg_success}
+    try:
+        request_data = request.get_json()
+        errors = validate_bulk_items(bulk_comments_schema, request_data, {'task_id': Task, 'author_id': User})
+        if errors:
+            response_object['status'] = status_msg_fail
+            response_object['message'] = 'Some of the comments were invalid, no comments were added'
+            response_object['errors'] = make_bulk_errors(errors)
+            return make_json_response(response_object, 400)
+        comments = bulk_comments_schema.load(request_data)
+        db.session.bulk_save_objects(comments)
+        db.session.commit()
+        task_ids = {comment.task_id for comment in comments if comment.task_id is not None}
+        if task_ids:
+            project_cache.invalidate(*Task.get_project_ids(task_ids))
+        response_object['created'] = len(comments)
+        response_object['message'] = 'Comments added successfully!'
+        return make_json_response(response_object, 200)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to add comments'
+        db.session.rollback()
+        return make_json_response(response_object, 400)
+
+@app.route('/api/search', methods=['GET'])
+def search_all():
+    if not is_search_supported():
+        response_object = {'status': status_msg_fail, 'message': 'Search is not supported by the database.'}
+        return make_json_response(response_object, 501)
+    response_object = {'status': status_msg_success}
+    try:
+        limit, cursor = get_pagination_args()
+        query = request.args.get('q')
+        searched_types = None
+        if request.args.get('type'):
+            searched_types = request.args['type'].split(',')
+            if not set(searched_types).issubset(search_types):
+                raise ValueError(f'Invalid search type {request.args["type"]}')
+        results, next_cursor = search(query, limit, cursor, searched_types)
+    except ValueError as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Invalid search parameters'
+        return make_json_response(response_object, 400)
+    except Exception as e:
+        response_object['status'] = status_msg_fail
+        response_object['message'] = 'Something went wrong when trying to search'
+        return make_json_response(response_object, 400)
+    response_object['results'] = results
+    response_object['next_cursor'] = next_cursor
+    response_object['message'] = 'Search completed successfully!'
+    return make_json_response(response_object, 200)
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    response_object = {'status': status_msg_success}
+    response_object['cache'] = project_cache.stats()
+    response_object['message'] = 'Cache statistics queried successfully!'
+    return make_json_response(response_object, 200)
+
+@app.route('/api/pool/stats', methods=['GET'])
+def get_database_pool_stats():
+    response_object = {'status': status_msg_success}
+    response_object['pool'] = get_pool_stats(db.engine)
+    response_object['pid'] = os.getpid()
+    response_object['message'] = 'Pool statistics queried successfully!'
+    return make_json_response(response_object, 200)
+
+@app.route('/api/admin/slow_queries', methods=['GET'])
+def get_slow_queries():
+    # Slow query log of the worker that handles the request
+    if not app.config['SLOW_QUERY_ENDPOINT_ENABLED']:
+        response_object = {'status': status_msg_fail, 'message': 'Slow query log is disabled.'}
+        return make_json_response(response_object, 404)
+    response_object = {'status': status_msg_success}
+    response_object['slow_queries'] = slow_query_log.get_queries()
+    response_object['threshold_ms'] = app.config['SLOW_QUERY_THRESHOLD']
+    response_object['pid'] = os.getpid()
+    response_object['message'] = 'Slow queries queried successfully!'
+    return make_json_response(response_object, 200)
+
+@app.route('/api/admin/slow_queries', methods=['DELETE'])
+def clear_slow_queries():
+    if not app.config['SLOW_QUERY_ENDPOINT_ENABLED']:
+        response_object = {'status': status_msg_fail, 'message': 'Slow query log is disabled.'}
+        return make_json_response(response_object, 404)
+    slow_query_log.clear()
+    response_object = {'status': status_msg_success}
+    response_object['message'] = 'Slow query log cleared successfully!'
+    return make_json_response(response_object, 200)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not app.config['METRICS_ENABLED']:
+        response_object = {'status': status_msg_fail, 'message': 'Metrics are disabled.'}
+        return make_json_response(response_object, 404)
+    metrics, content_type = generate_metrics()
+    return Response(metrics, content_type=content_type)
@@ -0,0 +1,191 @@
+import re
+
+from sqlalchemy import event, text
+
+from api import db
+from api.models import Task, Comment
+from api.utilities import encode_cursor
+
+# Full-text search over project names and descriptions, task names and comments.
+# PostgreSQL keeps the searchable text in tsvector columns with GIN indexes and
+# SQLite in one FTS5 table. Both are maintained by triggers, so every write path
+# including bulk inserts, imports and PATCH updates them. Migration 5c2e8d41f0b7
+# installs the same DDL to migrated databases, create_all() through the
+# listeners below.
+
+search_types = ['project', 'task', 'comment']
+
+# Other databases get neither the index nor search, /api/search answers 501 there
+search_dialects = ['postgresql', 'sqlite']
+
+# Searched columns of each type and the same text as SQL expression of the row
+search_columns = {
+    'project': ['name', 'description'],
+    'task': ['name'],
+    'comment': ['content']
+}
+search_contents = {
+    'project': "trim({row}.name || ' ' || coalesce({row}.description, ''))",
+    'task': '{row}.name',
+    'comment': '{row}.content'
+}
+
+def _postgresql_ddl():
+    statements = []
+    for search_type in search_types:
+        table = f'"{search_type}"'
+        columns = ', '.join(search_columns[search_type])
+        statements += [
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+            f'CREATE INDEX IF NOT EXISTS ix_{search_type}_search_vector ON {table} USING gin (search_vector)',
+            f'DROP TRIGGER IF EXISTS {search_type}_search_vector_update ON {table}',
+            f'CREATE TRIGGER {search_type}_search_vector_update BEFORE INSERT OR UPDATE ON {table} '
+            f"FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search_vector, 'pg_catalog.english', {columns})"
+        ]
+    return statements
+
+def _sqlite_ddl():
+    # Rows of the FTS table are addressed by rowid made of the object ID and the
+    # type, so the triggers don't have to scan the table
+    statements = [
+        'CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+        "type UNINDEXED, object_id UNINDEXED, content, tokenize = 'porter unicode61')"
+    ]
+    for type_code, search_type in enumerate(search_types):
+        table = f'"{search_type}"'
+        insert = (
+            'INSERT INTO search_index (rowid, type, object_id, content) '
+            f"VALUES (new.id * 3 + {type_code}, '{search_type}', new.id, {search_contents[search_type].format(row='new')});"
+        )
+        delete = f'DELETE FROM search_index WHERE rowid = old.id * 3 + {type_code};'
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS {search_type}_search_insert AFTER INSERT ON {table} BEGIN {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS {search_type}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END',
+            f'CREATE TRIGGER IF NOT EXISTS {search_type}_search_delete AFTER DELETE ON {table} BEGIN {delete} END'
+        ]
+    return statements
+
+def is_search_supported(dialect_name=None):
+    # Defaults to the database of the current session
+    if dialect_name is None:
+        dialect_name = db.session.get_bind().dialect.name
+    return dialect_name in search_dialects
+
+def create_search_index(target, connection, tables=None, **kw):
+    # Called also for binds that don't have the searched tables
+    if tables is not None and not set(search_types).issubset(table.name for table in tables):
+        return
+    if not is_search_supported(connection.dialect.name):
+        return
+    if connection.dialect.name == 'postgresql':
+        statements = _postgresql_ddl()
+    else:
+        statements = _sqlite_ddl()
+    for statement in statements:
+        connection.execute(text(statement))
+
+def drop_search_index(target, connection, **kw):
+    # PostgreSQL columns, indexes and triggers are dropped with the tables
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+def is_search_object(name, type_):
+    # Objects made by the DDL above. They aren't in the models, so Alembic
+    # autogenerate has to skip them instead of dropping them.
+    if type_ == 'table':
+        return name == 'search_index' or name.startswith('search_index_')
+    if type_ == 'column':
+        return name == 'search_vector'
+    if type_ == 'index':
+        return name is not None and name.startswith('ix_') and name.endswith('_search_vector')
+    return False
+
+event.listen(db.Model.metadata, 'after_create', create_search_index)
+event.listen(db.Model.metadata, 'before_drop', drop_search_index)
+
+def get_search_terms(query):
+    # Words of the query, searched with AND. Raises ValueError if there are none.
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        raise ValueError('Search query must contain at least one word')
+    return terms
+
+def _postgresql_matches(search_types_to_query):
+    match_queries = []
+    for search_type in search_types_to_query:
+        content = search_contents[search_type].format(row='searched')
+        match_queries.append(
+            f"SELECT '{search_type}' AS type, searched.id AS object_id, {content} AS content, "
+            f'-ts_rank(searched.search_vector, terms.query) AS score '
+            f'FROM "{search_type}" AS searched, terms WHERE searched.search_vector @@ terms.query'
+        )
+    return (
+        "WITH terms AS (SELECT plainto_tsquery('pg_catalog.english', :terms) AS query) "
+        'SELECT type, object_id, content, score FROM (' + ' UNION ALL '.join(match_queries) + ') AS matches'
+    )
+
+def _sqlite_matches(search_types_to_query):
+    type_filter = ', '.join(f"'{search_type}'" for search_type in search_types_to_query)
+    return (
+        'SELECT type, object_id, content, score FROM ('
+        'SELECT type, object_id, content, bm25(search_index) AS score FROM search_index '
+        f'WHERE search_index MATCH :terms AND type IN ({type_filter})) AS matches'
+    )
+
+def _add_project_ids(results):
+    # Projects of the tasks and comments on the page, two queries at most
+    task_ids = [result['id'] for result in results if result['type'] == 'task']
+    comment_ids = [result['id'] for result in results if result['type'] == 'comment']
+    task_project_ids = {}
+    comment_task_ids = {}
+    if task_ids:
+        task_project_ids = dict(
+            db.session.query(Task.id, Task.project_id).filter(Task.id.in_(task_ids)).all()
+        )
+    if comment_ids:
+        comment_rows = db.session.query(Comment.id, Comment.task_id, Task.project_id) \
+            .join(Task, Comment.task_id == Task.id) \
+            .filter(Comment.id.in_(comment_ids)).all()
+        comment_task_ids = {comment_id: (task_id, project_id) for comment_id, task_id, project_id in comment_rows}
+    for result in results:
+        if result['type'] == 'project':
+            result['project_id'] = result['id']
+        elif result['type'] == 'task':
+            result['project_id'] = task_project_ids.get(result['id'])
+        else:
+            result['task_id'], result['project_id'] = comment_task_ids.get(result['id'], (None, None))
+    return results
+
+def search(query, limit, cursor=None, search_types_to_query=None):
+    # Ranked matches of every searched type, best first. Pagination is keyset
+    # over (score, type, id) where lower score is better. Raises ValueError for
+    # invalid query or cursor. The database has to be checked with
+    # is_search_supported() first.
+    terms = get_search_terms(query)
+    search_types_to_query = search_types_to_query or search_types
+    if db.session.get_bind().dialect.name == 'postgresql':
+        statement = _postgresql_matches(search_types_to_query)
+        terms = ' '.join(terms)
+    else:
+        statement = _sqlite_matches(search_types_to_query)
+        terms = ' '.join(f'"{term}"' for term in terms)
+
+    parameters = {'terms': terms, 'limit': limit + 1}
+    if cursor is not None:
+        if cursor.get('type') not in search_types or not isinstance(cursor.get('score'), (int, float)):
+            raise ValueError('Invalid search cursor')
+        statement += ' WHERE (score, type, object_id) > (:score, :type, :id)'
+        parameters.update(score=cursor['score'], type=cursor['type'], id=cursor['id'])
+    statement += ' ORDER BY score, type, object_id LIMIT :limit'
+
+    rows = db.session.execute(text(statement), parameters).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_cursor({'id': last_row.object_id, 'type': last_row.type, 'score': last_row.score})
+    results = [
+        {'type': row.type, 'id': row.object_id, 'content': row.content}
+        for row in rows
+    ]
+    return _add_project_ids(results), next_cursor
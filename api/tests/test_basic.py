@@ -1,24 +1,115 @@
+import io
 import os
+import re
 import unittest
 import sys
 import json
+import gzip
+import logging
 from datetime import datetime
+from unittest import mock
 
 parent_dir = os.path.dirname
-test_db_name = 'test.db'
+# Every pytest-xdist worker process has its own database files
+test_worker = os.getenv('PYTEST_XDIST_WORKER')
+test_db_name = f'test_{test_worker}.db' if test_worker else 'test.db'
+test_replica_db_name = f'test_replica_{test_worker}.db' if test_worker else 'test_replica.db'
 # Add the package root directory to sys.path so imports work
 sys.path.append(parent_dir(parent_dir(parent_dir(os.path.abspath(__file__)))))
 
-from api import app, db
-from api.config import basedir
-from api.models import Project
+from sqlalchemy import event, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.util import ScopedRegistry
+from prometheus_client import REGISTRY
+
+from api import app, db, project_cache
+from api.cache import LRUCache, RedisCache, ProjectCache
+from api.export import import_records
+from api.responses import StdlibJSONEncoder, OrjsonEncoder, orjson
+from api.compression import brotli
+from api.config import Config, basedir, get_engine_options
+from api.instrumentation import slow_query_log
+from api.search import is_search_supported
+from api.database import RoutingSession, read_your_writes_cookie
+from api.models import Project, Task, User, Comment
+from api.utilities import encode_cursor
 
 json_header = {"Content-Type": "application/json"}
 
+# The schema is created once per process and every test runs in a transaction
+# that is rolled back afterwards. TODO_TEST_DATABASE=memory uses in-memory
+# SQLite instead of the file.
+if os.getenv('TODO_TEST_DATABASE', 'file') == 'memory':
+    test_database_url = 'sqlite://'
+else:
+    test_database_url = f'sqlite:///{basedir}/tests/{test_db_name}'
+# Sessions of the app outside the tests. The schemas hold db.session, so the
+# tests replace its registry instead of db.session itself.
+app_session_registry = db.session.registry
+# Statements of the savepoints made by the test sessions
+savepoint_statement = re.compile(r'^(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT) ')
+
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    # pysqlite would begin the transactions itself and break the savepoints,
+    # so they are begun explicitly on the engine's begin event instead
+    dbapi_connection.isolation_level = None
+
+def _emit_begin(conn):
+    conn.connection.execute('BEGIN')
+
+def setUpModule():
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = test_database_url
+    event.listen(db.engine, 'connect', _disable_pysqlite_transactions)
+    event.listen(db.engine, 'begin', _emit_begin)
+    db.drop_all()
+    db.create_all()
+
+def tearDownModule():
+    db.drop_all()
+    db.engine.dispose()
+    if test_database_url != 'sqlite://':
+        os.remove(f'{basedir}/tests/{test_db_name}')
+
+class SavepointSession(RoutingSession):
+    # Transactions of the session are savepoints within the transaction of the
+    # test, so the commits and rollbacks of the routes work as usual
+    def __init__(self, db, **options):
+        self.closing = False
+        RoutingSession.__init__(self, db, **options)
+        self.begin_savepoint()
+
+    def begin_savepoint(self):
+        # Emitted right away, so it isn't counted among the queries of the request
+        self.begin_nested()
+        self.connection(bind=self.bind)
+
+    def close(self):
+        # Requests close their sessions when they end. Uncommitted work is
+        # rolled back instead of leaving the savepoint open.
+        self.closing = True
+        self.rollback()
+        RoutingSession.close(self)
+        self.closing = False
+        self.begin_savepoint()
+
+@event.listens_for(SavepointSession, 'after_transaction_end')
+def _restart_savepoint(session, transaction):
+    if transaction.nested and not transaction.parent.nested and not session.closing:
+        # Expired like after a real commit or rollback
+        session.expire_all()
+        session.begin_savepoint()
+
 class BaseTest(unittest.TestCase):
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{basedir}/tests/{test_db_name}'
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        db.session.remove()
+        # Explicit binds of the tables would bypass the connection
+        db.session.registry = ScopedRegistry(
+            orm.sessionmaker(class_=SavepointSession, db=db, bind=self.connection, binds={}),
+            app_session_registry.scopefunc
+        )
 
         self.app = app.test_client()
         self.correct_project = {
@@ -54,11 +145,13 @@ class BaseTest(unittest.TestCase):
             {'name': 'Erkki Esimerkki'}
         ]
 
-        db.drop_all()
-        db.create_all()
+        project_cache.clear()
 
     def tearDown(self):
-        db.drop_all()
+        db.session.remove()
+        self.transaction.rollback()
+        self.connection.close()
+        db.session.registry = app_session_registry
 
     def _set_key_to_number_999(self, correct_data, data_key):
         incorrect_data = correct_data
@@ -92,6 +185,19 @@ class BaseTest(unittest.TestCase):
         )
         return response
 
+    def _count_queries(self, url, headers=None):
+        statements = []
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            if not savepoint_statement.match(statement):
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+        try:
+            response = self.app.get(url, headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_query)
+        return response, len(statements)
+
     def _add_project_for_task(self):
         project_json = json.dumps(self.correct_project)
         response = self.app.post(
@@ -113,6 +219,19 @@ class TestProjects(BaseTest):
         )
         return response
 
+    def _add_tasks_with_comment_and_assignee(self, project_id, task_count, assignee):
+        for i in range(task_count):
+            task = {'name': f'Test Task {i}', 'project_id': project_id}
+            task = self._add_task(task).get_json()['task']
+            self.app.post(
+                '/api/task/add_assignee',
+                headers=json_header,
+                data=json.dumps({'user': assignee, 'task': task})
+            )
+            comment = Comment(content='Test comment', task_id=task['id'], author_id=assignee['id'])
+            comment.save()
+        db.session.commit()
+
     def _add_project_with_task(self):
         add_project_response = self._add_project(self.correct_project)
         add_project_response_data = add_project_response.get_json()
@@ -266,6 +385,22 @@ class TestProjects(BaseTest):
         self.assertTrue(isinstance(response_data['projects'], list))
         self.assertEqual(len(response_data['projects']), 2)
 
+    def test_get_projects_with_invalid_pagination(self):
+        # Given there's multiple projects in database
+        for project in self.correct_projects:
+            self._add_project(project)
+
+        # When we query projects with invalid limit and cursor
+        limit_response = self.app.get('/api/projects?limit=0')
+        cursor_response = self.app.get('/api/projects?cursor=not-a-cursor')
+
+        # Then
+        for response in [limit_response, cursor_response]:
+            response_data = response.get_json()
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response_data['status'], 'fail')
+            self.assertEqual(response_data['message'], 'Invalid pagination parameters')
+
     def test_delete_project_successfully(self):
         # Given we have one project in the database
         add_project_response = self._add_project(self.correct_project)
@@ -319,6 +454,90 @@ class TestProjects(BaseTest):
         self.assertEqual(response_data['status'], 'fail')
         self.assertEqual(response_data['message'], 'Projects contains related tasks, unable to delete')
 
+    def test_delete_project_with_tasks_does_not_load_tasks(self):
+        # Given there's project with related tasks
+        project = self._add_project(self.correct_project).get_json()['project']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        self._add_tasks_with_comment_and_assignee(project['id'], 3, assignee)
+        statements = []
+        def record_query(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        # When that project is attempted to be deleted
+        event.listen(db.engine, 'before_cursor_execute', record_query)
+        try:
+            response = self.app.delete(f'/api/project/{project["id"]}')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record_query)
+
+        # Then task check is one EXISTS query
+        self.assertEqual(response.status_code, 400)
+        task_queries = [statement for statement in statements if 'FROM task' in statement]
+        self.assertEqual(len(task_queries), 1)
+        self.assertIn('EXISTS', task_queries[0])
+
+    def test_get_project_counts(self):
+        # Given there's project with tasks, one of them completed
+        project = self._add_project(self.correct_project).get_json()['project']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        self._add_tasks_with_comment_and_assignee(project['id'], 3, assignee)
+        task = Project.get_tree(project['id']).tasks[0]
+        task.completed = True
+        db.session.commit()
+
+        # When the counts are queried
+        response, query_count = self._count_queries(f'/api/project/{project["id"]}/counts')
+        not_found_response = self.app.get('/api/project/999/counts')
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['counts'], {'tasks': 3, 'completed_tasks': 1, 'comments': 3})
+        self.assertEqual(query_count, 1)
+        self.assertEqual(not_found_response.status_code, 404)
+
+    def test_get_projects_summary(self):
+        # Given there's project with completed, overdue and upcoming tasks and project without tasks
+        project = self._add_project(self.correct_project).get_json()['project']
+        empty_project = self._add_project(self.correct_projects[0]).get_json()['project']
+        tasks = [
+            {'name': 'Completed task', 'completed': True, 'planned_complete_date': '2000-01-01T00:00:00'},
+            {'name': 'Overdue task', 'planned_complete_date': '2000-01-01T00:00:00'},
+            {'name': 'Next task', 'planned_complete_date': '2999-01-01T00:00:00'},
+            {'name': 'Later task', 'planned_complete_date': '2999-06-01T00:00:00'}
+        ]
+        for task in tasks:
+            task['project_id'] = project['id']
+            self._add_task(task)
+
+        # When the summary is queried
+        response, query_count = self._count_queries('/api/projects/summary')
+        response_data = response.get_json()
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(query_count, 1)
+        self.assertEqual(response_data['projects'], [
+            {
+                'id': project['id'],
+                'name': project['name'],
+                'completed': False,
+                'tasks': 4,
+                'completed_tasks': 1,
+                'overdue_tasks': 1,
+                'next_planned_complete_date': '2999-01-01T00:00:00'
+            },
+            {
+                'id': empty_project['id'],
+                'name': empty_project['name'],
+                'completed': False,
+                'tasks': 0,
+                'completed_tasks': 0,
+                'overdue_tasks': 0,
+                'next_planned_complete_date': None
+            }
+        ])
+        self.assertEqual(response_data['next_cursor'], None)
+
     def test_get_single_project_successfully(self):
         # Given there's existing project in database
         add_project_response = self._add_project(self.correct_project)
@@ -340,6 +559,139 @@ class TestProjects(BaseTest):
         self.assertEqual(response_data['message'], 'Project queried successfully!')
         self.assertEqual(response_data['project'], project)
 
+    def test_get_project_query_count_does_not_grow_with_tasks(self):
+        # Given there's a project with tasks that have comments and assignees
+        project = self._add_project(self.correct_project).get_json()['project']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        self._add_tasks_with_comment_and_assignee(project['id'], 2, assignee)
+
+        # When the project and all projects are queried before and after adding more tasks
+        expand = 'expand=tasks.comments,tasks.assignees'
+        project_response, project_query_count = self._count_queries(f'/api/project/{project["id"]}?{expand}')
+        projects_response, projects_query_count = self._count_queries(f'/api/projects?{expand}')
+        self._add_tasks_with_comment_and_assignee(project['id'], 8, assignee)
+        more_project_response, more_project_query_count = self._count_queries(f'/api/project/{project["id"]}?{expand}')
+        more_projects_response, more_projects_query_count = self._count_queries(f'/api/projects?{expand}')
+
+        # Then the number of queries stays the same
+        self.assertEqual(len(project_response.get_json()['project']['tasks']), 2)
+        self.assertEqual(len(more_project_response.get_json()['project']['tasks']), 10)
+        self.assertEqual(len(more_projects_response.get_json()['projects'][0]['tasks']), 10)
+        for task in more_project_response.get_json()['project']['tasks']:
+            self.assertEqual(len(task['comments']), 1)
+            self.assertEqual(task['comment_count'], 1)
+            self.assertEqual(task['assignees'], [assignee])
+        self.assertEqual(project_query_count, more_project_query_count)
+        self.assertEqual(projects_query_count, more_projects_query_count)
+
+    def test_get_projects_with_fields_and_expand(self):
+        # Given there's a project with tasks that have comments and assignees
+        project = self._add_project(self.correct_project).get_json()['project']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        self._add_tasks_with_comment_and_assignee(project['id'], 2, assignee)
+
+        # When projects are queried with only some fields and relationships
+        picker_response, picker_query_count = self._count_queries('/api/projects?fields=id,name')
+        tasks_response, tasks_query_count = self._count_queries(
+            f'/api/project/{project["id"]}?expand=tasks.assignees'
+        )
+        full_response = self.app.get(f'/api/project/{project["id"]}')
+        invalid_field_response = self.app.get('/api/projects?fields=id,secret')
+        invalid_expand_response = self.app.get(f'/api/project/{project["id"]}?expand=owner')
+        task_names_response, task_names_query_count = self._count_queries(
+            f'/api/project/{project["id"]}?fields=tasks.name'
+        )
+        unexpanded_field_response = self.app.get(f'/api/project/{project["id"]}?fields=tasks.name&expand=')
+
+        # Then only the requested data is queried and returned
+        self.assertEqual(picker_response.get_json()['projects'], [{'id': project['id'], 'name': project['name']}])
+        # Page version and then the page
+        self.assertEqual(picker_query_count, 2)
+        project_tasks = tasks_response.get_json()['project']['tasks']
+        self.assertEqual(len(project_tasks), 2)
+        self.assertEqual(project_tasks[0]['assignees'], [assignee])
+        self.assertNotIn('comments', project_tasks[0])
+        # Four version queries and then project, tasks and assignees
+        self.assertEqual(tasks_query_count, 7)
+        self.assertNotEqual(tasks_response.headers['ETag'], full_response.headers['ETag'])
+        self.assertEqual(invalid_field_response.status_code, 400)
+        self.assertEqual(invalid_field_response.get_json()['message'], 'Invalid fields or expand parameters')
+        self.assertEqual(invalid_expand_response.status_code, 400)
+        # Fields of expanded relationship don't load its other relationships
+        self.assertEqual(task_names_response.get_json()['project'], {'tasks': [{'name': 'Test Task 0'}, {'name': 'Test Task 1'}]})
+        self.assertEqual(task_names_query_count, 6)
+        self.assertEqual(unexpanded_field_response.status_code, 400)
+        self.assertEqual(unexpanded_field_response.get_json()['message'], 'Invalid fields or expand parameters')
+
+    def test_get_unmodified_project_with_etag(self):
+        # Given there's existing project that has been queried once
+        project = self._add_project(self.correct_project).get_json()['project']
+        first_response = self.app.get(f'/api/project/{project["id"]}')
+        etag = first_response.headers['ETag']
+
+        # When the project is queried again with the ETag before and after adding a task to it
+        unmodified_response = self.app.get(f'/api/project/{project["id"]}', headers={'If-None-Match': etag})
+        self._add_task({'name': 'Test task', 'project_id': project['id']})
+        modified_response = self.app.get(f'/api/project/{project["id"]}', headers={'If-None-Match': etag})
+
+        # Then
+        self.assertEqual(first_response.status_code, 200)
+        self.assertEqual(unmodified_response.status_code, 304)
+        self.assertEqual(unmodified_response.data, b'')
+        self.assertEqual(unmodified_response.headers['ETag'], etag)
+        self.assertEqual(modified_response.status_code, 200)
+        self.assertNotEqual(modified_response.headers['ETag'], etag)
+        self.assertEqual(len(modified_response.get_json()['project']['tasks']), 1)
+
+    def test_get_unmodified_projects_with_etag(self):
+        # Given there's project with task and the projects have been queried once
+        project = self._add_project(self.correct_project).get_json()['project']
+        task = self._add_task({'name': 'Test task', 'project_id': project['id']}).get_json()['task']
+        user = self._add_user(self.correct_user).get_json()['user']
+        etag = self.app.get('/api/projects').headers['ETag']
+
+        # When the projects are queried again with the ETag before and after
+        # assigning the task
+        unmodified_response, query_count = self._count_queries('/api/projects', headers={'If-None-Match': etag})
+        self.app.post('/api/tasks/add_assignees', headers=json_header,
+                      data=json.dumps({'task_ids': [task['id']], 'user_ids': [user['id']]}))
+        assigned_response = self.app.get('/api/projects', headers={'If-None-Match': etag})
+
+        # Then the page isn't loaded for the unmodified response
+        self.assertEqual(unmodified_response.status_code, 304)
+        self.assertEqual(unmodified_response.headers['ETag'], etag)
+        # Projects, tasks, comments and assignees of the page version
+        self.assertEqual(query_count, 4)
+        self.assertEqual(assigned_response.status_code, 200)
+        self.assertEqual(assigned_response.get_json()['projects'][0]['tasks'][0]['assignees'][0]['id'], user['id'])
+
+    def test_project_etag_changes_with_assignees_and_deleted_tasks(self):
+        # Given there's project with two tasks that has been queried once
+        project = self._add_project(self.correct_project).get_json()['project']
+        tasks = [self._add_task({'name': name, 'project_id': project['id']}).get_json()['task'] for name in ['Task 1', 'Task 2']]
+        user = self._add_user(self.correct_user).get_json()['user']
+        first_response = self.app.get(f'/api/project/{project["id"]}')
+        etag = first_response.headers['ETag']
+
+        # When a user is assigned to a task and the other task deleted
+        self.app.post('/api/tasks/add_assignees', headers=json_header,
+                      data=json.dumps({'task_ids': [tasks[0]['id']], 'user_ids': [user['id']]}))
+        assigned_response = self.app.get(f'/api/project/{project["id"]}', headers={'If-None-Match': etag})
+        assigned_etag = assigned_response.headers['ETag']
+        self.app.delete(f'/api/task/{tasks[1]["id"]}')
+        deleted_response = self.app.get(f'/api/project/{project["id"]}', headers={'If-None-Match': assigned_etag})
+        since_response = self.app.get(
+            f'/api/project/{project["id"]}', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+        )
+
+        # Then both changes are returned and dates aren't used for validation
+        self.assertNotIn('Last-Modified', first_response.headers)
+        self.assertEqual(assigned_response.status_code, 200)
+        self.assertEqual(assigned_response.get_json()['project']['tasks'][0]['assignees'][0]['id'], user['id'])
+        self.assertEqual(deleted_response.status_code, 200)
+        self.assertEqual(len(deleted_response.get_json()['project']['tasks']), 1)
+        self.assertEqual(since_response.status_code, 200)
+
     def test_get_non_existing_project(self):
         # Given there's nothing in the database and we query non-existing project
         project_id = 1
@@ -356,6 +708,774 @@ class TestProjects(BaseTest):
         self.assertEqual(response_data['status'], 'fail')
         self.assertEqual(response_data['message'], 'Queried project was not found')
 
+class TestBulk(BaseTest):
+    def _post_bulk(self, url, items):
+        return self.app.post(url, headers=json_header, data=json.dumps(items))
+
+    def _count_inserts(self, url, items):
+        statements = []
+        def count_insert(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT'):
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_insert)
+        try:
+            response = self._post_bulk(url, items)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_insert)
+        return response, len(statements)
+
+    def test_add_tasks_in_bulk(self):
+        # Given there's project in database
+        project_id = self._add_project_for_task()['project']['id']
+        tasks = [{'name': f'Test Task {i}', 'project_id': project_id} for i in range(50)]
+
+        # When we add the tasks in one request
+        response, insert_count = self._count_inserts('/api/tasks/bulk', tasks)
+        response_data = response.get_json()
+        project_data = self.app.get(f'/api/project/{project_id}').get_json()
+
+        # Then they are inserted in one batch
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_data['status'], 'success')
+        self.assertEqual(response_data['message'], 'Tasks added successfully!')
+        self.assertEqual(response_data['created'], 50)
+        self.assertEqual(insert_count, 1)
+        self.assertEqual(len(project_data['project']['tasks']), 50)
+        self.assertEqual(project_data['project']['tasks'][0]['completed'], False)
+
+    def test_add_tasks_in_bulk_with_invalid_items(self):
+        # Given there's project in database and tasks where some are invalid
+        project_id = self._add_project_for_task()['project']['id']
+        tasks = [
+            {'name': 'Test Task 1', 'project_id': project_id},
+            {'name': 999, 'project_id': project_id},
+            {'name': 'Test Task 3', 'project_id': 999},
+            {'name': 'Test Task 4', 'project_id': project_id, 'id': 1}
+        ]
+
+        # When we add the tasks in one request
+        response = self._post_bulk('/api/tasks/bulk', tasks)
+        response_data = response.get_json()
+
+        # Then errors are reported per item and nothing is added
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response_data['status'], 'fail')
+        self.assertEqual(response_data['message'], 'Some of the tasks were invalid, no tasks were added')
+        self.assertEqual([error['index'] for error in response_data['errors']], [1, 2, 3])
+        self.assertIn('name', response_data['errors'][0]['errors'])
+        self.assertEqual(response_data['errors'][1]['errors'], {'project_id': ['Project 999 not found']})
+        self.assertIn('id', response_data['errors'][2]['errors'])
+        self.assertEqual(self.app.get('/api/tasks').get_json()['tasks'], [])
+
+    def test_add_users_in_bulk(self):
+        # Given we have users where one has empty name
+        users = self.correct_users + [{'name': ''}]
+
+        # When we add the users with and without the invalid one
+        invalid_response = self._post_bulk('/api/users/bulk', users)
+        response = self._post_bulk('/api/users/bulk', self.correct_users)
+
+        # Then
+        self.assertEqual(invalid_response.status_code, 400)
+        self.assertEqual(invalid_response.get_json()['errors'], [{'index': 2, 'errors': {'name': ['User name can\'t be empty']}}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['created'], 2)
+        self.assertEqual(len(self.app.get('/api/users').get_json()['users']), 2)
+
+    def test_add_comments_in_bulk(self):
+        # Given there's task and user in database
+        task = self._add_task(self.correct_task).get_json()['task']
+        user = self._add_user(self.correct_user).get_json()['user']
+        comments = [{'content': f'Comment {i}', 'task_id': task['id'], 'author_id': user['id']} for i in range(3)]
+
+        # When we add the comments with and without invalid references
+        invalid_response = self._post_bulk('/api/comments/bulk', [{'content': 'Comment', 'task_id': 999, 'author_id': 999}])
+        response = self._post_bulk('/api/comments/bulk', comments)
+        task_data = self.app.get(f'/api/task/{task["id"]}').get_json()
+
+        # Then
+        self.assertEqual(invalid_response.status_code, 400)
+        self.assertEqual(invalid_response.get_json()['errors'][0]['errors'], {
+            'task_id': ['Task 999 not found'],
+            'author_id': ['User 999 not found']
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['created'], 3)
+        self.assertEqual(task_data['task']['comment_count'], 3)
+
+    def test_add_and_remove_assignees_in_bulk(self):
+        # Given there's three tasks, two users and one existing assignment
+        project_id = self._add_project_for_task()['project']['id']
+        self._post_bulk('/api/tasks/bulk', [{'name': f'Test Task {i}', 'project_id': project_id} for i in range(3)])
+        self._post_bulk('/api/users/bulk', self.correct_users)
+        task_ids = [task.id for task in Task.query.all()]
+        user_ids = [user.id for user in User.query.all()]
+        Task.query.get(task_ids[0]).add_assignee(User.query.get(user_ids[0]))
+        db.session.commit()
+        self.app.get(f'/api/project/{project_id}')
+
+        # When every user is assigned to every task and then removed from two tasks
+        add_response, insert_count = self._count_inserts(
+            '/api/tasks/add_assignees',
+            {'task_ids': task_ids, 'user_ids': user_ids}
+        )
+        repeated_add_response = self._post_bulk('/api/tasks/add_assignees', {'task_ids': task_ids, 'user_ids': user_ids})
+        project = self.app.get(f'/api/project/{project_id}').get_json()['project']
+        remove_response = self._post_bulk('/api/tasks/remove_assignees', {'task_ids': task_ids[1:], 'user_ids': user_ids})
+
+        # Then only missing pairs are inserted with one statement
+        self.assertEqual(add_response.status_code, 200)
+        self.assertEqual(add_response.get_json()['added'], 5)
+        self.assertEqual(insert_count, 1)
+        self.assertEqual(repeated_add_response.get_json()['added'], 0)
+        for task in project['tasks']:
+            self.assertEqual(sorted(assignee['id'] for assignee in task['assignees']), user_ids)
+        self.assertEqual(remove_response.get_json()['removed'], 4)
+        self.assertEqual(Task.get_counts(task_ids[0])['assignees'], 2)
+        self.assertEqual(Task.get_counts(task_ids[1])['assignees'], 0)
+
+    def test_add_assignees_in_bulk_with_invalid_ids(self):
+        # Given there's one task and one user
+        task = self._add_task(self.correct_task).get_json()['task']
+        user = self._add_user(self.correct_user).get_json()['user']
+
+        # When assignees are added with missing and invalid IDs
+        missing_response = self._post_bulk('/api/tasks/add_assignees', {'task_ids': [task['id'], 999], 'user_ids': [user['id']]})
+        invalid_response = self._post_bulk('/api/tasks/add_assignees', {'task_ids': [task['id']], 'user_ids': []})
+
+        # Then nothing is added
+        self.assertEqual(missing_response.status_code, 404)
+        self.assertEqual(missing_response.get_json()['errors'], {'task_ids': [999], 'user_ids': []})
+        self.assertEqual(invalid_response.status_code, 400)
+        self.assertEqual(invalid_response.get_json()['message'], 'user_ids must be non-empty list of IDs')
+        self.assertEqual(Task.get_counts(task['id'])['assignees'], 0)
+
+class TestExport(BaseTest):
+    def _add_project_with_assigned_task(self):
+        project = self._add_project_for_task()['project']
+        user = self._add_user(self.correct_user).get_json()['user']
+        task = self._add_task({'name': 'Test task', 'project_id': project['id']}).get_json()['task']
+        self.app.post(
+            '/api/task/add_assignee',
+            headers=json_header,
+            data=json.dumps({'user': user, 'task': task})
+        )
+        self.app.post(
+            '/api/comments/bulk',
+            headers=json_header,
+            data=json.dumps([{'content': 'Test comment', 'task_id': task['id'], 'author_id': user['id']}])
+        )
+        return project
+
+    def test_export_project(self):
+        # Given there's two projects and one of them has assigned task with comment
+        project = self._add_project_with_assigned_task()
+        self._add_project_for_task()
+        self._add_user({'name': 'Unrelated user'})
+
+        # When the project is exported
+        response = self.app.get(f'/api/project/{project["id"]}/export')
+        records = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+
+        # Then the project and everything it references is exported in import order
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([record['type'] for record in records], ['user', 'project', 'task', 'comment', 'assignee'])
+        self.assertEqual(records[0]['data']['name'], self.correct_user['name'])
+        self.assertEqual(records[1]['data']['id'], project['id'])
+        self.assertEqual(records[4]['data'], {'task_id': 1, 'assignee_id': 1})
+
+    def test_export_non_existing_project(self):
+        # Given there's nothing in the database
+
+        # When non-existing project is exported
+        response = self.app.get('/api/project/1/export')
+
+        # Then
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['message'], 'Exported project was not found')
+
+    def test_import_exported_database(self):
+        # Given there's exported database
+        project = self._add_project_with_assigned_task()
+        original_project = self.app.get(f'/api/project/{project["id"]}').get_json()['project']
+        export_lines = self.app.get('/api/export').data.decode('utf-8').splitlines(keepends=True)
+
+        # When the export is imported into empty database in small batches
+        db.Model.metadata.drop_all(bind=self.connection)
+        db.Model.metadata.create_all(bind=self.connection)
+        counts = import_records(export_lines, batch_size=1)
+        imported_project = self.app.get(f'/api/project/{project["id"]}').get_json()['project']
+
+        # Then
+        self.assertEqual(counts, {'user': 1, 'project': 1, 'task': 1, 'comment': 1, 'assignee': 1})
+        self.assertEqual(imported_project, original_project)
+
+    def test_import_invalid_record(self):
+        # Given there's export with invalid line
+        export_lines = ['{"type": "user", "data": {"id": 1, "name": "Masa"}}\n', 'not json\n']
+
+        # When it's imported
+        # Then nothing is imported
+        with self.assertRaises(ValueError):
+            import_records(export_lines)
+        self.assertEqual(self.app.get('/api/users').get_json()['users'], [])
+
+class TestSearch(BaseTest):
+    def _search(self, query):
+        return self.app.get(f'/api/search?{query}')
+
+    def _add_searchable_data(self):
+        project = self._add_project({'name': 'Accounting', 'description': 'Invoices and receipts'}).get_json()['project']
+        author = self._add_user(self.correct_user).get_json()['user']
+        task = self._add_task({'name': 'Send invoice to client', 'project_id': project['id']}).get_json()['task']
+        self._add_task({'name': 'Book meeting', 'project_id': project['id']})
+        Comment(content='The invoice for March is late', task_id=task['id'], author_id=author['id']).save()
+        db.session.commit()
+        return project, task
+
+    def _add_project(self, project):
+        return self.app.post('/api/project', headers=json_header, data=json.dumps(project))
+
+    def test_search_across_types(self):
+        # Given there's project, task and comment mentioning invoices
+        project, task = self._add_searchable_data()
+
+        # When invoices are searched
+        response = self._search('q=invoices')
+        comment_response = self._search('q=invoice+march&type=comment')
+
+        # Then all of them are found with their projects
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual(sorted(result['type'] for result in results), ['comment', 'project', 'task'])
+        for result in results:
+            self.assertEqual(result['project_id'], project['id'])
+        self.assertEqual(comment_response.get_json()['results'], [{
+            'type': 'comment',
+            'id': 1,
+            'content': 'The invoice for March is late',
+            'task_id': task['id'],
+            'project_id': project['id']
+        }])
+
+    def test_search_page_by_page(self):
+        # Given there's five tasks mentioning invoices
+        project_id = self._add_project_for_task()['project']['id']
+        for i in range(5):
+            self._add_task({'name': f'Invoice {i}', 'project_id': project_id})
+
+        # When they are searched two at a time
+        task_ids = []
+        cursor = ''
+        while cursor is not None:
+            response_data = self._search(f'q=invoice&limit=2&cursor={cursor}').get_json()
+            task_ids += [result['id'] for result in response_data['results']]
+            cursor = response_data['next_cursor']
+
+        # Then every task is found once
+        self.assertEqual(sorted(task_ids), [1, 2, 3, 4, 5])
+        self.assertEqual(len(task_ids), 5)
+
+    def test_search_index_follows_writes(self):
+        # Given there's searchable task
+        project, task = self._add_searchable_data()
+
+        # When the task is renamed and the comment deleted
+        self.app.patch(f'/api/task/{task["id"]}', headers=json_header, data=json.dumps({'name': 'Pay bills'}))
+        Comment.query.delete()
+        db.session.commit()
+        invoice_results = self._search('q=invoice').get_json()['results']
+        bill_results = self._search('q=bill').get_json()['results']
+
+        # Then only the project mentions invoices anymore
+        self.assertEqual([result['type'] for result in invoice_results], ['project'])
+        self.assertEqual([(result['type'], result['id']) for result in bill_results], [('task', task['id'])])
+
+    def test_search_with_invalid_parameters(self):
+        # Given there's nothing in the database
+        # When search is done without words or with unknown type
+        empty_response = self._search('q=%22%2A')
+        type_response = self._search('q=invoice&type=user')
+
+        # Then
+        self.assertEqual(empty_response.status_code, 400)
+        self.assertEqual(empty_response.get_json()['message'], 'Invalid search parameters')
+        self.assertEqual(type_response.status_code, 400)
+
+    def test_search_on_unsupported_database(self):
+        # Given search isn't supported on any database
+        # When search is done
+        with mock.patch('api.search.search_dialects', []):
+            response = self._search('q=invoice')
+
+        # Then
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.get_json()['message'], 'Search is not supported by the database.')
+        self.assertFalse(is_search_supported('mysql'))
+
+class TestInstrumentation(BaseTest):
+    def tearDown(self):
+        app.config['INSTRUMENTATION_ENABLED'] = False
+        app.config['SLOW_QUERY_THRESHOLD'] = Config.SLOW_QUERY_THRESHOLD
+        app.config['SLOW_QUERY_EXPLAIN'] = Config.SLOW_QUERY_EXPLAIN
+        app.config['SLOW_QUERY_ENDPOINT_ENABLED'] = Config.SLOW_QUERY_ENDPOINT_ENABLED
+        slow_query_log.clear()
+        super().tearDown()
+
+    def test_request_timings_are_reported(self):
+        # Given instrumentation is enabled, its log is written to a buffer and
+        # there's project with task
+        app.config['INSTRUMENTATION_ENABLED'] = True
+        task = self._add_task(self.correct_task).get_json()['task']
+        handler = logging.getLogger('api.instrumentation').handlers[0]
+        log_stream = handler.setStream(io.StringIO())
+
+        # When the project is queried
+        try:
+            response, query_count = self._count_queries(f'/api/project/{task["project_id"]}')
+        finally:
+            log_lines = handler.setStream(log_stream).getvalue().splitlines()
+
+        # Then the timings are in the header and log line
+        server_timing = response.headers['Server-Timing']
+        self.assertIn('app;dur=', server_timing)
+        self.assertIn('db;dur=', server_timing)
+        self.assertIn(f'desc="{query_count} queries"', server_timing)
+        self.assertIn('INFO in api.instrumentation: ', log_lines[-1])
+        request_timing = json.loads(log_lines[-1].split(': ', 1)[1])
+        self.assertEqual(request_timing['endpoint'], 'get_project')
+        self.assertEqual(request_timing['status'], 200)
+        self.assertEqual(request_timing['query_count'], query_count)
+        self.assertEqual(request_timing['response_bytes'], len(response.data))
+        self.assertGreaterEqual(request_timing['duration_ms'], request_timing['db_ms'])
+
+    def test_request_timings_are_opt_in(self):
+        # Given instrumentation is disabled
+        # When projects are queried
+        response = self.app.get('/api/projects')
+
+        # Then
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def _without_savepoints(self, slow_queries):
+        # Savepoints of the test sessions are slow queries too
+        return [query for query in slow_queries if not savepoint_statement.match(query['statement'])]
+
+    def test_slow_queries_are_logged(self):
+        # Given every query is slow and there's project with task
+        task = self._add_task(self.correct_task).get_json()['task']
+        app.config['SLOW_QUERY_THRESHOLD'] = 1e-9
+        app.config['SLOW_QUERY_ENDPOINT_ENABLED'] = True
+        slow_query_log.clear()
+
+        # When the task is queried
+        with self.assertLogs('api.instrumentation', level='WARNING') as logs:
+            self.app.get(f'/api/task/{task["id"]}')
+        response = self.app.get('/api/admin/slow_queries')
+
+        # Then its queries are logged with the route
+        slow_queries = response.get_json()['slow_queries']
+        task_queries = [query for query in self._without_savepoints(slow_queries) if query['endpoint'] == 'get_task']
+        logged_queries = self._without_savepoints([json.loads(record.getMessage()) for record in logs.records])
+        self.assertEqual(len(task_queries), len(logged_queries))
+        self.assertIn(task['id'], task_queries[-1]['parameters'])
+        self.assertIn('FROM task', task_queries[-1]['statement'])
+        self.assertEqual(task_queries[-1]['path'], f'/api/task/{task["id"]}')
+        self.assertNotIn('explain', task_queries[-1])
+        # Newest first
+        self.assertGreaterEqual(slow_queries[0]['recorded_at'], slow_queries[-1]['recorded_at'])
+
+    def test_slow_query_explain_is_captured(self):
+        # Given every query is slow and their plans are captured
+        task = self._add_task(self.correct_task).get_json()['task']
+        app.config['SLOW_QUERY_THRESHOLD'] = 1e-9
+        app.config['SLOW_QUERY_EXPLAIN'] = 'plan'
+        slow_query_log.clear()
+
+        # When the task is queried
+        with self.assertLogs('api.instrumentation', level='WARNING'):
+            self.app.get(f'/api/task/{task["id"]}')
+
+        # Then the plan of the task query uses the primary key
+        slow_queries = self._without_savepoints(slow_query_log.get_queries())
+        task_query = [query for query in slow_queries if query['endpoint'] == 'get_task'][-1]
+        self.assertIn('USING INTEGER PRIMARY KEY', task_query['explain'])
+
+    def test_slow_query_log_is_bounded(self):
+        # Given every query is slow
+        app.config['SLOW_QUERY_THRESHOLD'] = 1e-9
+        app.config['SLOW_QUERY_ENDPOINT_ENABLED'] = True
+        slow_query_log.clear()
+
+        # When more queries than fit to the log are made
+        with self.assertLogs('api.instrumentation', level='WARNING'):
+            for i in range(app.config['SLOW_QUERY_LOG_SIZE'] + 1):
+                self.app.get('/api/projects')
+        slow_query_count = len(slow_query_log.get_queries())
+        response = self.app.delete('/api/admin/slow_queries')
+
+        # Then the oldest are dropped and the log can be cleared
+        self.assertEqual(slow_query_count, app.config['SLOW_QUERY_LOG_SIZE'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._without_savepoints(slow_query_log.get_queries()), [])
+
+    def test_slow_query_endpoint_is_opt_in(self):
+        # Given every query is slow and the endpoint isn't enabled
+        app.config['SLOW_QUERY_THRESHOLD'] = 1e-9
+        with self.assertLogs('api.instrumentation', level='WARNING'):
+            self.app.get('/api/projects')
+
+        # When the log is queried and cleared
+        get_response = self.app.get('/api/admin/slow_queries')
+        delete_response = self.app.delete('/api/admin/slow_queries')
+
+        # Then neither is served and the log is kept
+        self.assertEqual(get_response.status_code, 404)
+        self.assertNotIn('slow_queries', get_response.get_json())
+        self.assertEqual(delete_response.status_code, 404)
+        self.assertNotEqual(slow_query_log.get_queries(), [])
+
+class TestMetrics(BaseTest):
+    def tearDown(self):
+        app.config['METRICS_ENABLED'] = True
+        super().tearDown()
+
+    def _get_sample(self, name, labels=None):
+        return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+    def test_request_metrics_are_recorded(self):
+        # Given there's a project
+        project = self._add_project_for_task()['project']
+        labels = {'method': 'GET', 'endpoint': 'get_project'}
+        requests_before = self._get_sample('todo_http_requests_total', dict(labels, status='200'))
+        latencies_before = self._get_sample('todo_http_request_duration_seconds_count', labels)
+        # The test holds its own connection
+        connections_before = self._get_sample('todo_db_connections_checked_out')
+
+        # When the project is queried and metrics scraped
+        self.app.get(f'/api/project/{project["id"]}')
+        response = self.app.get('/metrics')
+
+        # Then the request is counted and its latency observed
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn(b'todo_http_request_duration_seconds_bucket', response.data)
+        self.assertEqual(self._get_sample('todo_http_requests_total', dict(labels, status='200')), requests_before + 1)
+        self.assertEqual(self._get_sample('todo_http_request_duration_seconds_count', labels), latencies_before + 1)
+        self.assertEqual(self._get_sample('todo_http_requests_in_progress'), 0)
+        self.assertEqual(self._get_sample('todo_db_connections_checked_out'), connections_before)
+
+    def test_cache_metrics_are_recorded(self):
+        # Given there's a project
+        project = self._add_project_for_task()['project']
+        hits_before = self._get_sample('todo_project_cache_requests_total', {'result': 'hit'})
+
+        # When it's queried twice
+        self.app.get(f'/api/project/{project["id"]}')
+        self.app.get(f'/api/project/{project["id"]}')
+
+        # Then the second query is counted as hit
+        self.assertEqual(self._get_sample('todo_project_cache_requests_total', {'result': 'hit'}), hits_before + 1)
+
+    def test_metrics_can_be_disabled(self):
+        # Given metrics are disabled
+        app.config['METRICS_ENABLED'] = False
+        requests_before = self._get_sample('todo_http_requests_total', {'method': 'GET', 'endpoint': 'get_all_projects', 'status': '200'})
+
+        # When projects are queried
+        self.app.get('/api/projects')
+        response = self.app.get('/metrics')
+
+        # Then nothing is recorded or served
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self._get_sample('todo_http_requests_total', {'method': 'GET', 'endpoint': 'get_all_projects', 'status': '200'}), requests_before)
+
+class TestJSONEncoders(BaseTest):
+    def test_encoders_produce_same_json(self):
+        # Given there's data with datetimes and the available encoders
+        data = {'id': 1, 'name': 'Meikäläinen', 'created_at': datetime(2020, 4, 25, 14, 21, 28, 681421)}
+        encoders = [StdlibJSONEncoder()]
+        if orjson is not None:
+            encoders.append(OrjsonEncoder())
+
+        # When the data is encoded compact and indented
+        for encoder in encoders:
+            compact_json = encoder.encode(data)
+            indented_json = encoder.encode(data, compact=False)
+
+            # Then
+            self.assertNotIn(b' ', compact_json)
+            self.assertIn(b'\n', indented_json)
+            for encoded_json in [compact_json, indented_json]:
+                self.assertEqual(json.loads(encoded_json), {
+                    'id': 1,
+                    'name': 'Meikäläinen',
+                    'created_at': '2020-04-25T14:21:28.681421'
+                })
+
+    def test_response_uses_configured_encoder(self):
+        # Given the stdlib encoder is configured
+        configured_encoder = app.extensions['json_encoder']
+        app.extensions['json_encoder'] = StdlibJSONEncoder()
+
+        # When a response is created
+        try:
+            response = self._add_user(self.correct_user)
+        finally:
+            app.extensions['json_encoder'] = configured_encoder
+
+        # Then
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.get_json()['user']['name'], self.correct_user['name'])
+
+class TestCompression(BaseTest):
+    def _add_many_tasks(self, count):
+        project_id = self._add_project_for_task()['project']['id']
+        tasks = [{'name': f'Test Task {i}', 'project_id': project_id} for i in range(count)]
+        self.app.post('/api/tasks/bulk', headers=json_header, data=json.dumps(tasks))
+        return project_id
+
+    def test_large_response_is_gzipped(self):
+        # Given there's many tasks in database
+        self._add_many_tasks(50)
+
+        # When tasks are queried by client that accepts gzip
+        response = self.app.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+        uncompressed_response = self.app.get('/api/tasks')
+
+        # Then
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), uncompressed_response.data)
+        self.assertLess(len(response.data), len(uncompressed_response.data))
+        self.assertNotIn('Content-Encoding', uncompressed_response.headers)
+
+    def test_small_response_is_not_compressed(self):
+        # Given there's one user in database
+        self._add_user(self.correct_user)
+
+        # When the user is queried by client that accepts gzip
+        response = self.app.get('/api/user/1', headers={'Accept-Encoding': 'gzip'})
+
+        # Then
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_json()['user']['name'], self.correct_user['name'])
+
+    def test_compressed_response_has_weak_etag(self):
+        # Given there's project with many tasks that has been queried with gzip
+        project_id = self._add_many_tasks(50)
+        headers = {'Accept-Encoding': 'gzip'}
+        first_response = self.app.get(f'/api/project/{project_id}', headers=headers)
+        etag = first_response.headers['ETag']
+
+        # When the project is queried again with the ETag
+        headers['If-None-Match'] = etag
+        response = self.app.get(f'/api/project/{project_id}', headers=headers)
+
+        # Then
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(response.status_code, 304)
+
+    def test_streamed_export_is_compressed(self):
+        # Given there's many tasks in database
+        self._add_many_tasks(5)
+
+        # When the database is exported by client that accepts gzip
+        response = self.app.get('/api/export', headers={'Accept-Encoding': 'gzip'})
+        is_streamed = response.is_streamed
+        response_data = response.data
+        uncompressed_data = self.app.get('/api/export').data
+
+        # Then
+        self.assertTrue(is_streamed)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response_data), uncompressed_data)
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        # Given there's many tasks in database
+        self._add_many_tasks(50)
+
+        # When tasks are queried by client that accepts brotli and gzip
+        response = self.app.get('/api/tasks', headers={'Accept-Encoding': 'gzip, deflate, br'})
+
+        # Then
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.data))['status'], 'success')
+
+class FakeRedis(object):
+    # Stand-in for redis.Redis client with the methods RedisCache uses
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value.encode('utf-8')
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in self.values if key.startswith(match.rstrip('*'))]
+
+class TestProjectCache(BaseTest):
+    def _get_project(self, project_id):
+        return self.app.get(f'/api/project/{project_id}').get_json()
+
+    def test_project_is_served_from_cache(self):
+        # Given there's existing project in database
+        project = self._add_project_for_task()['project']
+
+        # When the project is queried twice
+        first_response_data = self._get_project(project['id'])
+        second_response_data = self._get_project(project['id'])
+        stats = self.app.get('/api/cache/stats').get_json()['cache']
+
+        # Then the second query is a hit
+        self.assertEqual(first_response_data, second_response_data)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+    def test_cached_project_is_invalidated_by_task_changes(self):
+        # Given there's cached project with task that has an assignee
+        project = self._add_project_for_task()['project']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        task = self._add_task({'name': 'Test task', 'project_id': project['id']}).get_json()['task']
+        self._get_project(project['id'])
+
+        # When the task is assigned, updated and deleted
+        self.app.post(
+            '/api/task/add_assignee',
+            headers=json_header,
+            data=json.dumps({'user': assignee, 'task': task})
+        )
+        invalidated_entry = project_cache.backend.get(f'project:{project["id"]}')
+        assigned_project = self._get_project(project['id'])['project']
+        task['name'] = 'Updated task name'
+        self.app.put(f'/api/task/{task["id"]}', headers=json_header, data=json.dumps(task))
+        updated_project = self._get_project(project['id'])['project']
+        self.app.delete(f'/api/task/{task["id"]}')
+        deleted_project = self._get_project(project['id'])['project']
+
+        # Then the cached entry is removed and every query after a change sees the change
+        self.assertEqual(invalidated_entry, None)
+        self.assertEqual(assigned_project['tasks'][0]['assignees'], [assignee])
+        self.assertEqual(updated_project['tasks'][0]['name'], 'Updated task name')
+        self.assertEqual(deleted_project['tasks'], [])
+        self.assertEqual(project_cache.stats()['hits'], 0)
+
+    def test_lru_cache_evicts_least_recently_used_and_expired(self):
+        # Given there's full cache
+        cache = LRUCache(max_size=2, ttl=300)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # When one entry is used and new one added
+        cache.get('a')
+        cache.set('c', 3)
+
+        # Then the unused entry is evicted
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+        # And entries expire after ttl
+        cache.ttl = -1
+        cache.set('d', 4)
+        self.assertEqual(cache.get('d'), None)
+
+    def test_redis_cache_backend(self):
+        # Given there's project cache with Redis compatible backend
+        cache = ProjectCache(RedisCache(FakeRedis()))
+        project_json = {'id': 1, 'name': 'Test Project', 'tasks': []}
+
+        # When project is cached and invalidated
+        cache.set(1, 'etag', project_json)
+        cached_project = cache.get(1, 'etag')
+        other_version = cache.get(1, 'other-etag')
+        cache.invalidate(1)
+        invalidated_project = cache.get(1, 'etag')
+
+        # Then
+        self.assertEqual(cached_project, project_json)
+        self.assertEqual(other_version, None)
+        self.assertEqual(invalidated_project, None)
+        self.assertEqual(cache.stats(), {'backend': 'RedisCache', 'hits': 1, 'misses': 2})
+
+class TestDatabasePool(BaseTest):
+    def test_pool_stats(self):
+        # Given the app is running
+        # When pool statistics are queried
+        response = self.app.get('/api/pool/stats')
+        response_data = response.get_json()
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_data['pool']['pool_class'], type(db.engine.pool).__name__)
+        self.assertEqual(response_data['pid'], os.getpid())
+
+    def test_queue_pool_options_are_dropped_for_sqlite(self):
+        # Given there are pool options from the config
+        engine_options = get_engine_options()
+
+        # When SQLite engine is created with them
+        engine = db.create_engine(make_url(f'sqlite:///{basedir}/tests/{test_db_name}'), engine_options)
+
+        # Then engine is created and pre-ping is kept
+        self.assertEqual(engine.pool._pre_ping, engine_options['pool_pre_ping'])
+        engine.dispose()
+
+class TestReplicaRouting(BaseTest):
+    # Primary and replica are separate SQLite files, so nothing is replicated and
+    # the reads show which database was used
+    def setUp(self):
+        super().setUp()
+        app.config['SQLALCHEMY_BINDS'] = {'replica': f'sqlite:///{basedir}/tests/{test_replica_db_name}'}
+        db.session.remove()
+        self.replica_engine = db.get_engine(app, bind='replica')
+        db.Model.metadata.drop_all(bind=self.replica_engine)
+        db.Model.metadata.create_all(bind=self.replica_engine)
+
+    def tearDown(self):
+        db.Model.metadata.drop_all(bind=self.replica_engine)
+        self.replica_engine.dispose()
+        os.remove(f'{basedir}/tests/{test_replica_db_name}')
+        app.config['SQLALCHEMY_BINDS'] = None
+        app.config['READ_YOUR_WRITES_WINDOW'] = 5
+        db.session.remove()
+        super().tearDown()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        # Given client without read-your-writes window
+        app.config['READ_YOUR_WRITES_WINDOW'] = 0
+
+        # When project is added and projects are queried
+        add_response = self.app.post('/api/project', headers=json_header, data=json.dumps(self.correct_project))
+        projects = self.app.get('/api/projects').get_json()['projects']
+
+        # Then project is in primary but not in replica
+        self.assertEqual(add_response.status_code, 200)
+        self.assertEqual(projects, [])
+        self.assertEqual(Project.query.count(), 1)
+
+    def test_client_reads_own_writes_from_primary(self):
+        # Given client has added a project
+        add_response = self.app.post('/api/project', headers=json_header, data=json.dumps(self.correct_project))
+
+        # When the client and another client query projects
+        own_projects = self.app.get('/api/projects').get_json()['projects']
+        other_projects = app.test_client().get('/api/projects').get_json()['projects']
+
+        # Then only the client that wrote reads from primary
+        self.assertIn(read_your_writes_cookie, add_response.headers['Set-Cookie'])
+        self.assertEqual(len(own_projects), 1)
+        self.assertEqual(other_projects, [])
+
 class TestTasks(BaseTest):
     def _add_assignee_to_task(self, user, task):
         # Merging the two dictionaries together
@@ -774,6 +1894,243 @@ class TestTasks(BaseTest):
         self.assertTrue(isinstance(response_data['tasks'], list))
         self.assertEqual(len(response_data['tasks']), 2)
 
+    def test_get_unmodified_tasks_with_etag(self):
+        # Given there's multiple tasks in database that have been queried once
+        for task in self.correct_tasks:
+            self._add_task(task)
+        etag = self.app.get('/api/tasks').headers['ETag']
+
+        # When the tasks are queried again with the ETag before and after
+        # commenting one of them
+        response, query_count = self._count_queries('/api/tasks', headers={'If-None-Match': etag})
+        task = Task.query.first()
+        Comment(content='Test comment', task_id=task.id).save()
+        db.session.commit()
+        commented_response = self.app.get('/api/tasks', headers={'If-None-Match': etag})
+
+        # Then the page isn't loaded for the unmodified response
+        self.assertEqual(response.status_code, 304)
+        # Tasks, comments and assignees of the page version
+        self.assertEqual(query_count, 3)
+        self.assertEqual(commented_response.status_code, 200)
+        self.assertEqual(commented_response.get_json()['tasks'][0]['comment_count'], 1)
+
+    def test_get_tasks_page_by_page(self):
+        # Given there's five tasks in the same project
+        project_id = self._add_project_for_task()['project']['id']
+        for i in range(5):
+            self._add_task({'name': f'Test Task {i}', 'project_id': project_id})
+
+        # When we query the tasks two at a time following the cursor
+        task_ids = []
+        cursor = ''
+        page_count = 0
+        while cursor is not None:
+            response = self.app.get(f'/api/tasks?limit=2&cursor={cursor}')
+            response_data = response.get_json()
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response_data['tasks']), 2)
+            task_ids += [task['id'] for task in response_data['tasks']]
+            cursor = response_data['next_cursor']
+            page_count += 1
+
+        # Then every task is returned once and in order
+        self.assertEqual(page_count, 3)
+        self.assertEqual(task_ids, [1, 2, 3, 4, 5])
+
+    def _get_all_task_pages(self, query):
+        task_names = []
+        cursor = ''
+        while cursor is not None:
+            response = self.app.get(f'/api/tasks?{query}&limit=2&cursor={cursor}')
+            self.assertEqual(response.status_code, 200)
+            response_data = response.get_json()
+            task_names += [task['name'] for task in response_data['tasks']]
+            cursor = response_data['next_cursor']
+        return task_names
+
+    def test_get_tasks_with_filters(self):
+        # Given there's tasks in two projects with different due dates and states
+        project_id = self._add_project_for_task()['project']['id']
+        other_project_id = self._add_project_for_task()['project']['id']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        tasks = [
+            {'name': 'Done', 'project_id': project_id, 'completed': True, 'planned_complete_date': '2020-01-01T00:00:00'},
+            {'name': 'January', 'project_id': project_id, 'planned_complete_date': '2020-01-15T00:00:00'},
+            {'name': 'February', 'project_id': project_id, 'planned_complete_date': '2020-02-15T00:00:00'},
+            {'name': 'Other project', 'project_id': other_project_id, 'planned_complete_date': '2020-01-20T00:00:00'}
+        ]
+        for task in tasks:
+            self._add_task(task)
+        february_task = Task.query.filter_by(name='February').one()
+        february_task.add_assignee(User.query.get(assignee['id']))
+        db.session.commit()
+
+        # When tasks are filtered
+        open_tasks = self._get_all_task_pages(f'project_id={project_id}&completed=false')
+        january_tasks = self._get_all_task_pages('due_after=2020-01-10&due_before=2020-02-01T00:00:00%2B00:00')
+        assigned_tasks = self._get_all_task_pages(f'assignee_id={assignee["id"]}')
+        invalid_response = self.app.get('/api/tasks?completed=maybe')
+
+        # Then only the matching tasks are returned
+        self.assertEqual(open_tasks, ['January', 'February'])
+        self.assertEqual(january_tasks, ['January', 'Other project'])
+        self.assertEqual(assigned_tasks, ['February'])
+        self.assertEqual(invalid_response.status_code, 400)
+        self.assertEqual(invalid_response.get_json()['message'], 'Invalid filter parameters')
+
+    def test_get_tasks_sorted_page_by_page(self):
+        # Given there's tasks with and without due dates, some on the same date
+        project_id = self._add_project_for_task()['project']['id']
+        tasks = [
+            ('No date 1', None),
+            ('March', '2020-03-01T00:00:00'),
+            ('January 1', '2020-01-01T00:00:00'),
+            ('No date 2', None),
+            ('January 2', '2020-01-01T00:00:00'),
+            ('February', '2020-02-01T00:00:00')
+        ]
+        for name, planned_complete_date in tasks:
+            self._add_task({'name': name, 'project_id': project_id, 'planned_complete_date': planned_complete_date})
+
+        # When the tasks are queried in both directions by due date
+        ascending_tasks = self._get_all_task_pages('sort=planned_complete_date')
+        descending_tasks = self._get_all_task_pages('sort=-planned_complete_date')
+        first_page = self.app.get('/api/tasks?sort=name&limit=2').get_json()
+        mismatched_cursor_response = self.app.get(f'/api/tasks?sort=created_at&cursor={first_page["next_cursor"]}')
+
+        # Then every task is returned once, tasks without due date last
+        self.assertEqual(ascending_tasks, ['January 1', 'January 2', 'February', 'March', 'No date 1', 'No date 2'])
+        self.assertEqual(descending_tasks, ['March', 'February', 'January 2', 'January 1', 'No date 2', 'No date 1'])
+        self.assertEqual(mismatched_cursor_response.status_code, 400)
+        self.assertEqual(mismatched_cursor_response.get_json()['message'], 'Invalid pagination parameters')
+
+    def test_get_tasks_with_invalid_cursor_sort_value(self):
+        # Given there's task
+        self._add_task(self.correct_task)
+
+        # When the tasks are queried with cursors that have wrong type or malformed sort value
+        cursors = [
+            {'id': 1, 'sort_by': 'created_at', 'sort': 5},
+            {'id': 1, 'sort_by': 'created_at', 'sort': 'yesterday'},
+            {'id': 1, 'sort_by': 'name', 'sort': ['Test task']}
+        ]
+        responses = [
+            self.app.get(f'/api/tasks?sort={cursor["sort_by"]}&cursor={encode_cursor(cursor)}')
+            for cursor in cursors
+        ]
+
+        # Then
+        for response in responses:
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['message'], 'Invalid pagination parameters')
+
+    def test_sorted_task_cursor_on_other_lists(self):
+        # Given there's cursor of tasks sorted by name
+        project_id = self._add_project_for_task()['project']['id']
+        task_ids = [
+            self._add_task({'name': f'Test Task {i}', 'project_id': project_id}).get_json()['task']['id']
+            for i in range(3)
+        ]
+        cursor = self.app.get('/api/tasks?sort=name&limit=2').get_json()['next_cursor']
+
+        # When it's used for the other lists
+        responses = [
+            self.app.get(f'{url}?cursor={cursor}')
+            for url in ['/api/projects', '/api/projects/summary', '/api/users', f'/api/task/{task_ids[0]}/comments']
+        ]
+
+        # Then
+        for response in responses:
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['message'], 'Invalid pagination parameters')
+
+    def test_get_tasks_with_fields_and_expand(self):
+        # Given there's a task with comment
+        task = self._add_task(self.correct_task).get_json()['task']
+        assignee = self._add_user(self.correct_user).get_json()['user']
+        Comment(content='Test comment', task_id=task['id'], author_id=assignee['id']).save()
+        db.session.commit()
+
+        # When the task is queried without relationships and the tasks with comments only
+        task_response = self.app.get(f'/api/task/{task["id"]}?fields=id,name,completed&expand=')
+        tasks_response = self.app.get('/api/tasks?expand=comments')
+        comments_response = self.app.get(f'/api/task/{task["id"]}?fields=comments&expand=comments')
+        unexpanded_comments_response = self.app.get(f'/api/task/{task["id"]}?fields=comments')
+
+        # Then
+        self.assertEqual(task_response.get_json()['task'], {'id': task['id'], 'name': task['name'], 'completed': False})
+        listed_task = tasks_response.get_json()['tasks'][0]
+        self.assertEqual(len(listed_task['comments']), 1)
+        self.assertNotIn('assignees', listed_task)
+        self.assertEqual(list(comments_response.get_json()['task']), ['comments'])
+        self.assertEqual(len(comments_response.get_json()['task']['comments']), 1)
+        self.assertEqual(unexpanded_comments_response.status_code, 400)
+        self.assertEqual(unexpanded_comments_response.get_json()['message'], 'Invalid fields or expand parameters')
+
+    def _patch_task(self, task_id, data):
+        return self.app.patch(f'/api/task/{task_id}', headers=json_header, data=json.dumps(data))
+
+    def test_patch_task_completed_state(self):
+        # Given there's task that hasn't been completed
+        task = self._add_task(self.correct_task).get_json()['task']
+
+        # When the task is completed twice and then reopened
+        completed_response = self._patch_task(task['id'], {'completed': True})
+        completed_again_response = self._patch_task(task['id'], {'completed': True, 'name': 'Renamed task'})
+        reopened_response = self._patch_task(task['id'], {'completed': False})
+
+        # Then only the changed columns are returned and completed_at changes with the state
+        completed_task = completed_response.get_json()['task']
+        self.assertEqual(completed_response.status_code, 200)
+        self.assertEqual(
+            set(completed_task),
+            {'id', 'project_id', 'completed', 'completed_at', 'updated_at'}
+        )
+        self.assertEqual(completed_task['completed'], True)
+        self.assertNotEqual(completed_task['completed_at'], None)
+        completed_again_task = completed_again_response.get_json()['task']
+        self.assertEqual(completed_again_task['completed_at'], completed_task['completed_at'])
+        self.assertEqual(completed_again_task['name'], 'Renamed task')
+        self.assertEqual(reopened_response.get_json()['task']['completed_at'], None)
+        self.assertEqual(self.app.get(f'/api/task/{task["id"]}').get_json()['task']['name'], 'Renamed task')
+
+    def test_patch_task_moves_task_between_cached_projects(self):
+        # Given there's task in a cached project and another cached project
+        task = self._add_task(self.correct_task).get_json()['task']
+        other_project = self._add_project_for_task()['project']
+        self.app.get(f'/api/project/{task["project_id"]}')
+        self.app.get(f'/api/project/{other_project["id"]}')
+
+        # When the task is moved to the other project
+        response = self._patch_task(task['id'], {'project_id': other_project['id']})
+        previous_project = self.app.get(f'/api/project/{task["project_id"]}').get_json()['project']
+        new_project = self.app.get(f'/api/project/{other_project["id"]}').get_json()['project']
+
+        # Then both projects show the move
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(previous_project['tasks'], [])
+        self.assertEqual([project_task['id'] for project_task in new_project['tasks']], [task['id']])
+
+    def test_patch_task_with_invalid_data(self):
+        # Given there's task
+        task = self._add_task(self.correct_task).get_json()['task']
+
+        # When the task is patched with invalid data and non-existing task is patched
+        unknown_field_response = self._patch_task(task['id'], {'comments': []})
+        invalid_value_response = self._patch_task(task['id'], {'completed': 'maybe'})
+        missing_project_response = self._patch_task(task['id'], {'project_id': 999})
+        empty_response = self._patch_task(task['id'], {})
+        not_found_response = self._patch_task(999, {'name': 'Test task'})
+
+        # Then
+        for response in [unknown_field_response, invalid_value_response, missing_project_response, empty_response]:
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()['message'], 'Invalid task data')
+        self.assertIn('project_id', missing_project_response.get_json()['errors'])
+        self.assertEqual(not_found_response.status_code, 404)
+        self.assertEqual(not_found_response.get_json()['message'], 'Task not found')
+
     def test_delete_task_successfully(self):
         # Given we have one task in the database
         add_task_response = self._add_task(self.correct_task)
@@ -810,6 +2167,29 @@ class TestTasks(BaseTest):
         self.assertEqual(response_data['status'], 'fail')
         self.assertEqual(response_data['message'], 'Task not found')
 
+    def test_get_task_counts(self):
+        # Given there's task with comment and two assignees
+        task = self._add_task(self.correct_task).get_json()['task']
+        for user in self.correct_users:
+            assignee = self._add_user(user).get_json()['user']
+            task = self.app.post(
+                '/api/task/add_assignee',
+                headers=json_header,
+                data=json.dumps({'user': assignee, 'task': task})
+            ).get_json()['task']
+        Comment(content='Test comment', task_id=task['id'], author_id=assignee['id']).save()
+        db.session.commit()
+
+        # When the counts are queried
+        response = self.app.get(f'/api/task/{task["id"]}/counts')
+        not_found_response = self.app.get('/api/task/999/counts')
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['counts'], {'comments': 1, 'assignees': 2})
+        self.assertEqual(not_found_response.status_code, 404)
+        self.assertEqual(not_found_response.get_json()['message'], 'Queried task was not found')
+
     def test_get_single_task_successfully(self):
         # Given there's existing task in database
         add_task_response = self._add_task(self.correct_task)
@@ -818,9 +2198,9 @@ class TestTasks(BaseTest):
         task = add_task_response_data['task']
         task_id = task['id']
 
-        # When that task is queried
+        # When that task is queried with all relationships
         response = self.app.get(
-            f'/api/task/{task_id}',
+            f'/api/task/{task_id}?expand=comments,assignees',
             headers=json_header
         )
         response_data = response.get_json()
@@ -831,6 +2211,71 @@ class TestTasks(BaseTest):
         self.assertEqual(response_data['message'], 'Task queried successfully!')
         self.assertEqual(response_data['task'], task)
 
+    def test_get_task_comments_page_by_page(self):
+        # Given there's task with five comments, two of them created at the same time
+        task = self._add_task(self.correct_task).get_json()['task']
+        author = self._add_user(self.correct_user).get_json()['user']
+        created_at_values = [
+            datetime(2020, 1, 3), datetime(2020, 1, 1), datetime(2020, 1, 2),
+            datetime(2020, 1, 2), datetime(2020, 1, 4)
+        ]
+        for i, created_at in enumerate(created_at_values):
+            Comment(content=f'Comment {i}', task_id=task['id'], author_id=author['id'], created_at=created_at).save()
+        db.session.commit()
+
+        # When the comments are queried two at a time and the task without them
+        comment_contents = []
+        cursor = ''
+        while cursor is not None:
+            response = self.app.get(f'/api/task/{task["id"]}/comments?limit=2&cursor={cursor}')
+            self.assertEqual(response.status_code, 200)
+            comment_contents += [comment['content'] for comment in response.get_json()['comments']]
+            cursor = response.get_json()['next_cursor']
+        task_data = self.app.get(f'/api/task/{task["id"]}').get_json()['task']
+        not_found_response = self.app.get('/api/task/999/comments')
+
+        # Then every comment is returned once, oldest first
+        self.assertEqual(comment_contents, ['Comment 1', 'Comment 2', 'Comment 3', 'Comment 0', 'Comment 4'])
+        self.assertEqual(task_data['comment_count'], 5)
+        self.assertNotIn('comments', task_data)
+        self.assertEqual(not_found_response.status_code, 404)
+
+    def test_get_unmodified_task_comments_with_etag(self):
+        # Given there's task with comment and its comments have been queried once
+        task = self._add_task(self.correct_task).get_json()['task']
+        Comment(content='Test comment', task_id=task['id']).save()
+        db.session.commit()
+        etag = self.app.get(f'/api/task/{task["id"]}/comments').headers['ETag']
+
+        # When the comments are queried again with the ETag before and after editing the comment
+        unmodified_response = self.app.get(f'/api/task/{task["id"]}/comments', headers={'If-None-Match': etag})
+        comment = Comment.query.filter_by(task_id=task['id']).one()
+        comment.content = 'Edited comment'
+        db.session.commit()
+        edited_response = self.app.get(f'/api/task/{task["id"]}/comments', headers={'If-None-Match': etag})
+
+        # Then
+        self.assertEqual(unmodified_response.status_code, 304)
+        self.assertEqual(edited_response.status_code, 200)
+        self.assertEqual(edited_response.get_json()['comments'][0]['content'], 'Edited comment')
+
+    def test_get_unmodified_task_with_etag(self):
+        # Given there's existing task that has been queried once
+        task = self._add_task(self.correct_task).get_json()['task']
+        first_response = self.app.get(f'/api/task/{task["id"]}')
+        etag = first_response.headers['ETag']
+
+        # When the task is queried again with the ETag before and after it's updated
+        unmodified_response = self.app.get(f'/api/task/{task["id"]}', headers={'If-None-Match': etag})
+        task['name'] = 'Updated task name'
+        self._update_task(task)
+        modified_response = self.app.get(f'/api/task/{task["id"]}', headers={'If-None-Match': etag})
+
+        # Then
+        self.assertEqual(unmodified_response.status_code, 304)
+        self.assertEqual(modified_response.status_code, 200)
+        self.assertEqual(modified_response.get_json()['task']['name'], 'Updated task name')
+
     def test_get_non_existing_task(self):
         # Given there's nothing in the database and we query non-existing task
         task_id = 1
@@ -1089,6 +2534,49 @@ class TestTasks(BaseTest):
         self.assertEqual(response_data['message'], 'Something went wrong when trying to update task')
 
 class TestUser(BaseTest):
+    def test_get_user_tasks(self):
+        # Given there's user assigned to tasks with different due dates and one task of another user
+        project_id = self._add_project_for_task()['project']['id']
+        user = self._add_user(self.correct_users[0]).get_json()['user']
+        other_user = self._add_user(self.correct_users[1]).get_json()['user']
+        tasks = [
+            ('No date', None, False),
+            ('March', '2020-03-01T00:00:00', False),
+            ('January', '2020-01-01T00:00:00', True),
+            ('February', '2020-02-01T00:00:00', False)
+        ]
+        for name, planned_complete_date, completed in tasks:
+            self._add_task({
+                'name': name,
+                'project_id': project_id,
+                'planned_complete_date': planned_complete_date,
+                'completed': completed
+            })
+        self._add_task({'name': 'Other user task', 'project_id': project_id})
+        task_ids = [task.id for task in Task.query.filter(Task.name != 'Other user task')]
+        other_task_id = Task.query.filter_by(name='Other user task').one().id
+        Task.add_assignees(task_ids, [user['id']])
+        Task.add_assignees([other_task_id], [other_user['id']])
+        db.session.commit()
+
+        # When the user's tasks are queried
+        response, query_count = self._count_queries(f'/api/user/{user["id"]}/tasks')
+        open_response = self.app.get(f'/api/user/{user["id"]}/tasks?completed=false&limit=2')
+        not_found_response = self.app.get('/api/user/999/tasks')
+
+        # Then the tasks are ordered by due date and loaded without per-task queries
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [task['name'] for task in response.get_json()['tasks']],
+            ['January', 'February', 'March', 'No date']
+        )
+        # User check, page version from tasks, comments and assignees, and then
+        # tasks and assignees
+        self.assertEqual(query_count, 6)
+        self.assertEqual([task['name'] for task in open_response.get_json()['tasks']], ['February', 'March'])
+        self.assertNotEqual(open_response.get_json()['next_cursor'], None)
+        self.assertEqual(not_found_response.status_code, 404)
+
 
     def _get_user(self, user_id):
         response = self.app.get(
@@ -1211,6 +2699,25 @@ class TestUser(BaseTest):
         self.assertTrue(isinstance(response_data['users'], list))
         self.assertEqual(len(response_data['users']), 2)
 
+    def test_get_unmodified_users_with_etag(self):
+        # Given there's multiple users that have been queried once
+        for user in self.correct_users:
+            self._add_user(user)
+        etag = self.app.get('/api/users').headers['ETag']
+
+        # When the users are queried again with the ETag before and after renaming one
+        unmodified_response, query_count = self._count_queries('/api/users', headers={'If-None-Match': etag})
+        user = User.query.first()
+        user.name = 'Renamed user'
+        db.session.commit()
+        renamed_response = self.app.get('/api/users', headers={'If-None-Match': etag})
+
+        # Then only the page version is queried for the unmodified response
+        self.assertEqual(unmodified_response.status_code, 304)
+        self.assertEqual(query_count, 1)
+        self.assertEqual(renamed_response.status_code, 200)
+        self.assertIn('Renamed user', [user['name'] for user in renamed_response.get_json()['users']])
+
     def test_delete_user_successfully(self):
         # Given we have one user in the database
         add_user_response = self._add_user(self.correct_user)
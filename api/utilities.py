@@ -1,4 +1,108 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 from uuid import uuid4
 
+from sqlalchemy import and_, case, or_, DateTime
+
 def generate_uuid():
-        return str(uuid4())
\ No newline at end of file
+        return str(uuid4())
+
+def encode_cursor(cursor):
+    # Cursors are opaque to the clients, they only pass back what they got
+    cursor_json = json.dumps(cursor, separators=(',', ':'))
+    return urlsafe_b64encode(cursor_json.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        cursor_json = urlsafe_b64decode((cursor + padding).encode('ascii'))
+        decoded_cursor = json.loads(cursor_json)
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid cursor {cursor}')
+    if not isinstance(decoded_cursor, dict) or not isinstance(decoded_cursor.get('id'), int):
+        raise ValueError(f'Invalid cursor {cursor}')
+    return decoded_cursor
+
+def _after(column, value, descending):
+    return column < value if descending else column > value
+
+def _load_sort_value(column, value):
+    # Cursor values are JSON, dates are stored as ISO 8601 strings. Raises
+    # ValueError for values the sort column can't have.
+    if value is None:
+        return value
+    try:
+        if isinstance(column.type, DateTime):
+            if not isinstance(value, str):
+                raise TypeError(f'{column.key} must be a string')
+            return datetime.fromisoformat(value)
+        if not isinstance(value, column.type.python_type):
+            raise TypeError(f'{column.key} must be {column.type.python_type.__name__}')
+    except (ValueError, TypeError):
+        raise ValueError(f'Invalid cursor sort value {value!r}')
+    return value
+
+def _dump_sort_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def paginate(query, key_column, limit, cursor=None, sort_column=None, descending=False, has_nulls=None):
+    # Keyset pagination: instead of OFFSET the next page continues after the last
+    # key of the previous page, so every page costs the same index range scan.
+    # With sort_column rows are ordered by it first and the unique key breaks the
+    # ties. NULL sort values come last in both directions. Raises ValueError if
+    # the cursor was made for another sort column. has_nulls defaults to the
+    # nullability of the sort column.
+    sort_key = sort_column.key if sort_column is not None else None
+    if cursor is not None:
+        if cursor.get('sort_by') != sort_key:
+            raise ValueError('Cursor does not match the sort order')
+        if sort_column is None:
+            query = query.filter(_after(key_column, cursor['id'], descending))
+        else:
+            sort_value = _load_sort_value(sort_column, cursor.get('sort'))
+            if sort_value is None:
+                query = query.filter(sort_column == None, _after(key_column, cursor['id'], descending))
+            else:
+                query = query.filter(or_(
+                    _after(sort_column, sort_value, descending),
+                    and_(sort_column == sort_value, _after(key_column, cursor['id'], descending)),
+                    sort_column == None
+                ))
+
+    order_by = [key_column.desc() if descending else key_column]
+    if sort_column is not None:
+        order_by.insert(0, sort_column.desc() if descending else sort_column)
+        if has_nulls is None:
+            has_nulls = sort_column.nullable
+        if has_nulls:
+            # Databases disagree where NULLs sort by default
+            order_by.insert(0, case([(sort_column == None, 1)], else_=0))
+
+    # Fetching one extra row tells if there's a next page without COUNT query
+    items = query.order_by(*order_by).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last_item = items[-1]
+        next_cursor = {'id': last_item.id}
+        if sort_column is not None:
+            next_cursor['sort_by'] = sort_key
+            next_cursor['sort'] = _dump_sort_value(getattr(last_item, sort_key))
+        next_cursor = encode_cursor(next_cursor)
+    return items, next_cursor
+
+def make_version(*row_groups):
+    # Builds strong ETag from plain column rows, e.g. (id, created_at, updated_at),
+    # of every object that's part of a response. There's no Last-Modified date:
+    # deleted rows and assignments don't leave a newer timestamp behind, and it
+    # has only one second resolution.
+    version_hash = hashlib.sha1()
+    for rows in row_groups:
+        for row in rows:
+            version_hash.update(repr(tuple(row)).encode('utf-8'))
+        version_hash.update(b'|')
+    return version_hash.hexdigest()
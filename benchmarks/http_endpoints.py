@@ -0,0 +1,397 @@
+# Latency, throughput and peak memory of every route in api/routes.py, driven
+# through the Flask test client and through a gunicorn server started with
+# gunicorn.conf.py. Each mode runs against a freshly seeded copy of the same
+# synthetic dataset, so reports of different commits can be compared.
+#
+# Usage: python -m benchmarks.http_endpoints --projects 20 --tasks-per-project 50 --output report.json
+# Without --database-url a temporary SQLite file is used. SQLite serializes
+# the writes of the gunicorn workers, use PostgreSQL for realistic numbers.
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from api import app, db
+from api.models import Project, Task, User, Comment, assignees_for_tasks
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+json_header = {'Content-Type': 'application/json'}
+
+class Dataset(object):
+    # IDs of the seeded rows. Rows after the regular ones are consumed by the
+    # DELETE requests, one per request. Until then the disposable users are
+    # assigned by the bulk assignment requests, so those don't collide with
+    # the assignments of the other requests.
+    def __init__(self, args):
+        self.projects = args.projects
+        self.tasks = args.projects * args.tasks_per_project
+        self.users = args.users
+        self.comments = self.tasks * args.comments_per_task
+        self.tasks_per_project = args.tasks_per_project
+        self.assignees_per_task = args.assignees_per_task
+        self.requests = args.requests
+
+    def project_id(self, rng):
+        return rng.randint(1, self.projects)
+
+    def task_id(self, rng):
+        return rng.randint(1, self.tasks)
+
+    def user_id(self, rng):
+        return rng.randint(1, self.users)
+
+    def task_project_id(self, task_id):
+        return (task_id - 1) // self.tasks_per_project + 1
+
+    def task_assignee_ids(self, task_id):
+        return [(task_id + i) % self.users + 1 for i in range(self.assignees_per_task)]
+
+    def disposable_project_id(self, i):
+        return self.projects + i + 1
+
+    def disposable_task_id(self, i):
+        return self.tasks + i + 1
+
+    def disposable_user_id(self, i):
+        return self.users + i + 1
+
+    def random_disposable_user_id(self, rng):
+        return self.users + rng.randint(1, self.requests)
+
+def seed(dataset, args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}'} for i in range(1, dataset.users + args.requests + 1)
+    ])
+    db.session.execute(Project.__table__.insert(), [{
+        'id': i,
+        'name': f'Project {i}',
+        'description': f'Synthetic project {i} for benchmarking',
+        'slug': f'project-{i}',
+        'created_at': now
+    } for i in range(1, dataset.projects + args.requests + 1)])
+    db.session.commit()
+    for start in range(1, dataset.tasks + args.requests + 1, args.batch_size):
+        task_ids = range(start, min(start + args.batch_size, dataset.tasks + args.requests + 1))
+        # Disposable tasks are in the last project, they don't have comments or assignees
+        regular_task_ids = [task_id for task_id in task_ids if task_id <= dataset.tasks]
+        db.session.execute(Task.__table__.insert(), [{
+            'id': task_id,
+            'name': f'Task {task_id}',
+            'completed': task_id % 3 == 0,
+            'created_at': now,
+            'planned_complete_date': now + timedelta(days=rng.randint(-30, 30)),
+            'project_id': dataset.task_project_id(min(task_id, dataset.tasks))
+        } for task_id in task_ids])
+        if regular_task_ids and args.comments_per_task:
+            db.session.execute(Comment.__table__.insert(), [{
+                'content': f'Comment {i} on task {task_id}',
+                'created_at': now + timedelta(seconds=i),
+                'task_id': task_id,
+                'author_id': dataset.user_id(rng)
+            } for task_id in regular_task_ids for i in range(args.comments_per_task)])
+        if regular_task_ids and args.assignees_per_task:
+            db.session.execute(assignees_for_tasks.insert(), [
+                {'task_id': task_id, 'assignee_id': assignee_id}
+                for task_id in regular_task_ids for assignee_id in dataset.task_assignee_ids(task_id)
+            ])
+        db.session.commit()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Explicit IDs don't advance the sequences used by the POST requests
+        for table in ['project', 'task', 'user', 'comment']:
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT max(id) FROM \"{table}\"))"
+            ))
+        db.session.commit()
+
+def make_endpoints(dataset):
+    # Functions returning method, URL and JSON body of the i:th request of each
+    # endpoint, keyed by the endpoint names of api/routes.py
+    def get(url):
+        return lambda i, rng: ('GET', url(i, rng), None)
+
+    def task_json(task_id):
+        return {'id': task_id, 'name': f'Task {task_id}', 'project_id': dataset.task_project_id(task_id)}
+
+    def assignment(task_id, user_id):
+        return {'task': task_json(task_id), 'user': {'id': user_id, 'name': f'User {user_id}'}}
+
+    def single_assignment(i):
+        # Assigned by add_assignee_to_task and then removed by remove_assignee_from_task
+        task_id = i % dataset.tasks + 1
+        return assignment(task_id, (task_id + dataset.assignees_per_task) % dataset.users + 1)
+
+    def bulk_assignment(rng):
+        # Both bulk requests get the same pairs, the same random sequence is used
+        return {
+            'task_ids': [dataset.task_id(rng) for _ in range(5)],
+            'user_ids': [dataset.random_disposable_user_id(rng) for _ in range(2)]
+        }
+
+    return {
+        'add_project': lambda i, rng: ('POST', '/api/project', {'name': f'New project {i}', 'description': 'Added'}),
+        'get_project': get(lambda i, rng: f'/api/project/{dataset.project_id(rng)}'),
+        'get_project_counts': get(lambda i, rng: f'/api/project/{dataset.project_id(rng)}/counts'),
+        'delete_project': lambda i, rng: ('DELETE', f'/api/project/{dataset.disposable_project_id(i)}', None),
+        'get_all_projects': get(lambda i, rng: '/api/projects'),
+        'get_projects_summary': get(lambda i, rng: '/api/projects/summary'),
+        'export_project': get(lambda i, rng: f'/api/project/{dataset.project_id(rng)}/export'),
+        'export_all': get(lambda i, rng: '/api/export'),
+        'add_task': lambda i, rng: ('POST', '/api/task', {'name': f'New task {i}', 'project_id': dataset.project_id(rng)}),
+        'add_tasks_bulk': lambda i, rng: ('POST', '/api/tasks/bulk', [
+            {'name': f'Bulk task {i}-{j}', 'project_id': dataset.project_id(rng)} for j in range(10)
+        ]),
+        'get_task': get(lambda i, rng: f'/api/task/{dataset.task_id(rng)}'),
+        'get_task_counts': get(lambda i, rng: f'/api/task/{dataset.task_id(rng)}/counts'),
+        'get_task_comments': get(lambda i, rng: f'/api/task/{dataset.task_id(rng)}/comments'),
+        'delete_task': lambda i, rng: ('DELETE', f'/api/task/{dataset.disposable_task_id(i)}', None),
+        'get_all_tasks': get(lambda i, rng: '/api/tasks?completed=false&sort=planned_complete_date'),
+        'add_assignee_to_task': lambda i, rng: ('POST', '/api/task/add_assignee', single_assignment(i)),
+        'add_assignees_to_tasks': lambda i, rng: ('POST', '/api/tasks/add_assignees', bulk_assignment(rng)),
+        'remove_assignees_from_tasks': lambda i, rng: ('POST', '/api/tasks/remove_assignees', bulk_assignment(rng)),
+        'update_task': lambda i, rng: (
+            'PUT', f'/api/task/{i % dataset.tasks + 1}', dict(task_json(i % dataset.tasks + 1), name=f'Updated task {i}')
+        ),
+        'patch_task': lambda i, rng: ('PATCH', f'/api/task/{dataset.task_id(rng)}', {'completed': i % 2 == 0}),
+        'remove_assignee_from_task': lambda i, rng: ('POST', '/api/task/remove_assignee', single_assignment(i)),
+        'add_user': lambda i, rng: ('POST', '/api/user', {'name': f'New user {i}'}),
+        'add_users_bulk': lambda i, rng: ('POST', '/api/users/bulk', [{'name': f'Bulk user {i}-{j}'} for j in range(10)]),
+        'get_user': get(lambda i, rng: f'/api/user/{dataset.user_id(rng)}'),
+        'get_user_tasks': get(lambda i, rng: f'/api/user/{dataset.user_id(rng)}/tasks'),
+        'delete_user': lambda i, rng: ('DELETE', f'/api/user/{dataset.disposable_user_id(i)}', None),
+        'get_all_user': get(lambda i, rng: '/api/users'),
+        'add_comments_bulk': lambda i, rng: ('POST', '/api/comments/bulk', [
+            {'content': f'Bulk comment {i}-{j}', 'task_id': dataset.task_id(rng), 'author_id': dataset.user_id(rng)}
+            for j in range(10)
+        ]),
+        'search_all': get(lambda i, rng: f'/api/search?q=task+{dataset.task_id(rng)}'),
+        'get_cache_stats': get(lambda i, rng: '/api/cache/stats'),
+        'get_database_pool_stats': get(lambda i, rng: '/api/pool/stats'),
+        'get_slow_queries': get(lambda i, rng: '/api/admin/slow_queries'),
+        'clear_slow_queries': lambda i, rng: ('DELETE', '/api/admin/slow_queries', None),
+        'get_metrics': get(lambda i, rng: '/metrics')
+    }
+
+def get_unbenchmarked_endpoints(endpoints):
+    return sorted(
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if rule.endpoint != 'static' and rule.endpoint not in endpoints
+    )
+
+def make_requests(make_request, args):
+    # Same requests in the same order for every mode
+    rng = random.Random(args.seed)
+    return [make_request(i, rng) for i in range(args.requests)]
+
+def percentile(sorted_timings, percent):
+    # Nearest-rank percentile
+    return sorted_timings[max(0, math.ceil(len(sorted_timings) * percent / 100) - 1)]
+
+def summarize(timings, statuses, duration):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'throughput_rps': round(len(timings) / duration, 1)
+    }
+
+def run_test_client(endpoints, args):
+    client = app.test_client()
+    results = {}
+    for name, make_request in endpoints.items():
+        timings = []
+        statuses = []
+        start = time.perf_counter()
+        for method, url, body in make_requests(make_request, args):
+            request_start = time.perf_counter()
+            response = client.open(url, method=method, data=json.dumps(body) if body is not None else None, headers=json_header)
+            # Streamed responses are generated while they are read
+            response.get_data()
+            timings.append((time.perf_counter() - request_start) * 1000)
+            statuses.append(response.status_code)
+        results[name] = summarize(timings, statuses, time.perf_counter() - start)
+    # Peak of the whole benchmark process, seeding included. Kilobytes on Linux.
+    return {'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'endpoints': results}
+
+def get_free_port():
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
+
+def get_process_tree_peak_rss(pid):
+    # Sum of the peak resident set sizes (VmHWM) of the gunicorn master and
+    # its workers in kilobytes. Needs /proc, None elsewhere.
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as children_file:
+            pids = [pid] + [int(child_pid) for child_pid in children_file.read().split()]
+        peak_rss = 0
+        for process_id in pids:
+            with open(f'/proc/{process_id}/status') as status_file:
+                for line in status_file:
+                    if line.startswith('VmHWM:'):
+                        peak_rss += int(line.split()[1])
+        return peak_rss
+    except (OSError, ValueError):
+        return None
+
+def start_gunicorn(database_url, port, args, metrics_dir):
+    env = dict(
+        os.environ,
+        TODO_ENVIRONMENT='stage',
+        TODO_DATABASE_URL_STAGE=database_url,
+        TODO_GUNICORN_BIND=f'127.0.0.1:{port}',
+        TODO_GUNICORN_WORKERS=str(args.workers),
+        TODO_METRICS_DIR=metrics_dir,
+        TODO_SLOW_QUERY_ENDPOINT_ENABLED='true'
+    )
+    env.pop('prometheus_multiproc_dir', None)
+    # gunicorn 20.0 can't be run with python -m, its script is next to the interpreter
+    gunicorn = shutil.which('gunicorn', path=os.path.dirname(sys.executable)) or 'gunicorn'
+    server = subprocess.Popen(
+        [gunicorn, '-c', 'gunicorn.conf.py', 'api:app'],
+        cwd=root_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {server.returncode}')
+        try:
+            send_request(port, ('GET', '/api/projects?limit=1', None))
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start in 30 seconds')
+
+def send_request(port, request):
+    method, url, body = request
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        start = time.perf_counter()
+        connection.request(method, url, body=json.dumps(body) if body is not None else None, headers=json_header)
+        response = connection.getresponse()
+        response.read()
+        return (time.perf_counter() - start) * 1000, response.status
+    finally:
+        connection.close()
+
+def run_gunicorn(endpoints, database_url, args):
+    port = get_free_port()
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        server = start_gunicorn(database_url, port, args, metrics_dir)
+        try:
+            results = {}
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                for name, make_request in endpoints.items():
+                    requests = make_requests(make_request, args)
+                    start = time.perf_counter()
+                    responses = list(executor.map(lambda request: send_request(port, request), requests))
+                    duration = time.perf_counter() - start
+                    results[name] = summarize(
+                        [timing for timing, status in responses], [status for timing, status in responses], duration
+                    )
+            return {
+                'workers': args.workers,
+                'concurrency': args.concurrency,
+                'peak_rss_kb': get_process_tree_peak_rss(server.pid),
+                'endpoints': results
+            }
+        finally:
+            server.terminate()
+            server.wait()
+
+def reset_database(dataset, args):
+    db.drop_all()
+    db.create_all()
+    seed(dataset, args)
+    # The gunicorn workers open their own connections
+    db.session.remove()
+    db.engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure latency, throughput and memory of every API endpoint')
+    parser.add_argument('--database-url', help='Database to use, its tables are recreated. Defaults to temporary SQLite file')
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--tasks-per-project', type=int, default=50)
+    parser.add_argument('--comments-per-task', type=int, default=5)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--assignees-per-task', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--mode', choices=['test_client', 'gunicorn', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests to gunicorn')
+    parser.add_argument('--endpoints', help='Comma separated endpoint names to run, defaults to all')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='File to write the JSON report to, defaults to stdout')
+    args = parser.parse_args()
+    if args.users <= args.assignees_per_task:
+        parser.error('--users must be greater than --assignees-per-task')
+
+    database_url = args.database_url
+    if database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        database_url = f'sqlite:///{database_file.name}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+
+    dataset = Dataset(args)
+    endpoints = make_endpoints(dataset)
+    unbenchmarked_endpoints = get_unbenchmarked_endpoints(endpoints)
+    if args.endpoints:
+        endpoints = {name: endpoints[name] for name in args.endpoints.split(',')}
+
+    report = {
+        'commit': subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=root_dir, capture_output=True, text=True
+        ).stdout.strip() or None,
+        'projects': dataset.projects,
+        'tasks': dataset.tasks,
+        'comments': dataset.comments,
+        'users': dataset.users,
+        'requests_per_endpoint': args.requests,
+        'unbenchmarked_endpoints': unbenchmarked_endpoints
+    }
+    with app.app_context():
+        report['dialect'] = db.engine.dialect.name
+        if args.mode in ('test_client', 'both'):
+            print('Seeding and running through the test client...', file=sys.stderr)
+            reset_database(dataset, args)
+            report['test_client'] = run_test_client(endpoints, args)
+        if args.mode in ('gunicorn', 'both'):
+            print('Seeding and running through gunicorn...', file=sys.stderr)
+            reset_database(dataset, args)
+            report['gunicorn'] = run_gunicorn(endpoints, database_url, args)
+        db.drop_all()
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report_json)
+    else:
+        print(report_json)
+
+    if args.database_url is None:
+        os.remove(database_file.name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Compares query plans and latency of the hot access paths with and without
+# the indexes on task, comment and assignees_for_tasks.
+#
+# Usage: python -m benchmarks.index_plans --tasks 1000000 --database-url postgresql://... --output report.json
+# Without --database-url a temporary SQLite file is used.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import db
+from api.models import assignees_for_tasks, Task, Comment
+
+INDEXES = list(Task.__table__.indexes) + list(Comment.__table__.indexes) + list(assignees_for_tasks.indexes)
+
+QUERIES = {
+    'open_tasks_of_project': (
+        'SELECT id, name FROM task WHERE project_id = :project_id AND completed = :completed',
+        lambda args: {'project_id': random.randint(1, args.projects), 'completed': False}
+    ),
+    'project_has_tasks': (
+        'SELECT EXISTS (SELECT 1 FROM task WHERE project_id = :project_id)',
+        lambda args: {'project_id': random.randint(1, args.projects)}
+    ),
+    'comments_of_task': (
+        'SELECT id, content FROM comment WHERE task_id = :task_id ORDER BY created_at',
+        lambda args: {'task_id': random.randint(1, args.tasks)}
+    ),
+    'assignees_of_task': (
+        'SELECT "user".id, "user".name FROM "user" JOIN assignees_for_tasks '
+        'ON "user".id = assignees_for_tasks.assignee_id WHERE assignees_for_tasks.task_id = :task_id',
+        lambda args: {'task_id': random.randint(1, args.tasks)}
+    ),
+    'tasks_of_assignee': (
+        'SELECT task_id FROM assignees_for_tasks WHERE assignee_id = :assignee_id',
+        lambda args: {'assignee_id': random.randint(1, args.users)}
+    ),
+}
+
+def seed(engine, args):
+    tables = db.metadata.tables
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(tables['user'].insert(), [{'id': i, 'name': f'User {i}'} for i in range(1, args.users + 1)])
+        conn.execute(tables['project'].insert(), [
+            {'id': i, 'name': f'Project {i}', 'completed': False, 'slug': f'project-{i}', 'created_at': now}
+            for i in range(1, args.projects + 1)
+        ])
+    for start in range(1, args.tasks + 1, args.batch_size):
+        task_ids = range(start, min(start + args.batch_size, args.tasks + 1))
+        with engine.begin() as conn:
+            conn.execute(tables['task'].insert(), [{
+                'id': task_id,
+                'name': f'Task {task_id}',
+                'completed': task_id % 3 == 0,
+                'created_at': now,
+                'project_id': (task_id - 1) // args.tasks_per_project + 1
+            } for task_id in task_ids])
+            conn.execute(tables['comment'].insert(), [{
+                'content': f'Comment {i} of task {task_id}',
+                'created_at': now + timedelta(seconds=i),
+                'task_id': task_id,
+                'author_id': random.randint(1, args.users)
+            } for task_id in task_ids for i in range(args.comments_per_task)])
+            conn.execute(tables['assignees_for_tasks'].insert(), [
+                {'task_id': task_id, 'assignee_id': task_id % args.users + 1} for task_id in task_ids
+            ])
+
+def explain(conn, dialect, sql, params):
+    if dialect == 'postgresql':
+        rows = conn.execute(text(f'EXPLAIN ANALYZE {sql}'), params).fetchall()
+    else:
+        rows = conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+    return [str(row[-1]) for row in rows]
+
+def measure(engine, args):
+    results = {}
+    with engine.connect() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text('ANALYZE'))
+        for name, (sql, make_params) in QUERIES.items():
+            plan = explain(conn, engine.dialect.name, sql, make_params(args))
+            timings = []
+            for _ in range(args.repeat):
+                params = make_params(args)
+                start = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = {
+                'plan': plan,
+                'mean_ms': round(sum(timings) / len(timings), 3),
+                'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3)
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare query plans and latency with and without indexes')
+    parser.add_argument('--database-url', help='Empty database to use, defaults to temporary SQLite file')
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--tasks-per-project', type=int, default=100)
+    parser.add_argument('--comments-per-task', type=int, default=1)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', help='File to write the JSON report to, defaults to stdout')
+    args = parser.parse_args()
+    args.projects = (args.tasks - 1) // args.tasks_per_project + 1
+
+    database_url = args.database_url
+    if database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        database_url = f'sqlite:///{database_file.name}'
+    engine = create_engine(database_url)
+
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    for index in INDEXES:
+        index.drop(engine)
+
+    print(f'Seeding {args.tasks} tasks...', file=sys.stderr)
+    seed(engine, args)
+    report = {'tasks': args.tasks, 'dialect': engine.dialect.name}
+    report['without_indexes'] = measure(engine, args)
+    for index in INDEXES:
+        index.create(engine)
+    report['with_indexes'] = measure(engine, args)
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report_json)
+    else:
+        print(report_json)
+
+    db.metadata.drop_all(engine)
+    if args.database_url is None:
+        os.remove(database_file.name)
+
+if __name__ == '__main__':
+    main()
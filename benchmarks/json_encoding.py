@@ -0,0 +1,96 @@
+# Micro-benchmark of encoding the /api/projects payload with Flask's jsonify
+# and with the response encoders in api/responses.py.
+#
+# Usage: python -m benchmarks.json_encoding --projects 50 --tasks-per-project 100 --output report.json
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify
+
+from api import app, db
+from api.models import Project, Task, User, Comment, assignees_for_tasks
+from api.responses import StdlibJSONEncoder, OrjsonEncoder, orjson
+from api.routes import projects_schema
+
+def seed(args):
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(User, [{'id': i, 'name': f'User {i}'} for i in range(1, 11)])
+    db.session.bulk_insert_mappings(Project, [
+        {'id': i, 'name': f'Project {i}', 'description': 'Benchmark project', 'slug': f'project-{i}', 'created_at': now}
+        for i in range(1, args.projects + 1)
+    ])
+    task_count = args.projects * args.tasks_per_project
+    db.session.bulk_insert_mappings(Task, [
+        {'id': i, 'name': f'Task {i}', 'created_at': now, 'planned_complete_date': now,
+         'project_id': (i - 1) // args.tasks_per_project + 1}
+        for i in range(1, task_count + 1)
+    ])
+    db.session.bulk_insert_mappings(Comment, [
+        {'content': f'Comment on task {i}', 'created_at': now, 'task_id': i, 'author_id': i % 10 + 1}
+        for i in range(1, task_count + 1)
+    ])
+    db.session.execute(assignees_for_tasks.insert(), [
+        {'task_id': i, 'assignee_id': i % 10 + 1} for i in range(1, task_count + 1)
+    ])
+    db.session.commit()
+
+def measure(encode, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'bytes': len(body),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'min_ms': round(timings[0], 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare JSON encoders on the /api/projects payload')
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--tasks-per-project', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='File to write the JSON report to, defaults to stdout')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    with app.test_request_context():
+        db.create_all()
+        seed(args)
+        response_object = {
+            'status': 'success',
+            'projects': projects_schema.dump(Project.get_all()),
+            'message': 'Projects queried succesfully!'
+        }
+        encoders = {
+            'flask_jsonify': lambda: jsonify(response_object).get_data(),
+            'json_compact': lambda: StdlibJSONEncoder().encode(response_object),
+            'json_indented': lambda: StdlibJSONEncoder().encode(response_object, compact=False)
+        }
+        if orjson is not None:
+            encoders['orjson_compact'] = lambda: OrjsonEncoder().encode(response_object)
+            encoders['orjson_indented'] = lambda: OrjsonEncoder().encode(response_object, compact=False)
+        report = {
+            'projects': args.projects,
+            'tasks': args.projects * args.tasks_per_project,
+            'encoders': {name: measure(encode, args.repeat) for name, encode in encoders.items()}
+        }
+        db.drop_all()
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report_json)
+    else:
+        print(report_json)
+
+if __name__ == '__main__':
+    main()
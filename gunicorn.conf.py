@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+import shutil
+
+# Gunicorn settings, used with: gunicorn -c gunicorn.conf.py api:app
+
+bind = os.getenv('TODO_GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('TODO_GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Workers write their Prometheus samples to files in this directory, /metrics
+# aggregates them. It has to be set before the workers import prometheus_client.
+metrics_dir = os.environ.setdefault(
+    'prometheus_multiproc_dir', os.getenv('TODO_METRICS_DIR', '/tmp/todo-api-metrics')
+)
+
+def on_starting(server):
+    # Samples of the previous run would be added to the new ones
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+def child_exit(server, worker):
+    # Drops the live gauges of the exited worker
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
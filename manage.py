@@ -1,6 +1,8 @@
+import click
 from flask.cli import FlaskGroup
 
 from api import app, db
+from api.export import export_records, import_records
 
 cli = FlaskGroup(app)
 
@@ -10,5 +12,20 @@ def create_db():
     db.create_all()
     db.session.commit()
 
+@cli.command('export')
+@click.option('--project-id', type=int, help='Export only this project')
+@click.option('--output', type=click.File('w'), required=True, help='File to write the records to')
+def export(project_id, output):
+    for line in export_records(project_id):
+        output.write(line)
+
+@cli.command('import')
+@click.argument('input_file', type=click.File('r'), default='-')
+@click.option('--batch-size', type=int, help='Records inserted at a time')
+def import_data(input_file, batch_size):
+    counts = import_records(input_file, batch_size)
+    for record_type, count in counts.items():
+        click.echo(f'Imported {count} {record_type} records', err=True)
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""add index for task due date filters and sorting
+
+Revision ID: 3b9f1c2d7a41
+Revises: e65cbc373edf
+Create Date: 2026-10-18 10:12:40.731284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f1c2d7a41'
+down_revision = 'e65cbc373edf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_task_planned_complete_date', 'task', ['planned_complete_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_planned_complete_date', table_name='task')
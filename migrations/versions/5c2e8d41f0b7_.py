@@ -0,0 +1,79 @@
+"""add full-text search columns, indexes and triggers
+
+Revision ID: 5c2e8d41f0b7
+Revises: 3b9f1c2d7a41
+Create Date: 2026-10-18 11:03:17.204519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8d41f0b7'
+down_revision = '3b9f1c2d7a41'
+branch_labels = None
+depends_on = None
+
+# Searched columns of each table and the same text as SQL expression of the row.
+# PostgreSQL uses tsvector columns and SQLite one FTS5 table, see api/search.py.
+search_columns = {
+    'project': ['name', 'description'],
+    'task': ['name'],
+    'comment': ['content']
+}
+search_contents = {
+    'project': "trim({row}.name || ' ' || coalesce({row}.description, ''))",
+    'task': '{row}.name',
+    'comment': '{row}.content'
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in search_columns:
+            columns = ', '.join(search_columns[table])
+            op.execute(f'ALTER TABLE "{table}" ADD COLUMN search_vector tsvector')
+            op.execute(
+                f'CREATE TRIGGER {table}_search_vector_update BEFORE INSERT OR UPDATE ON "{table}" '
+                f"FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search_vector, 'pg_catalog.english', {columns})"
+            )
+            # Existing rows are indexed before the index is built
+            content = search_contents[table].format(row=f'"{table}"')
+            op.execute(f'UPDATE "{table}" SET search_vector = to_tsvector(\'pg_catalog.english\', {content})')
+            op.execute(f'CREATE INDEX ix_{table}_search_vector ON "{table}" USING gin (search_vector)')
+    elif dialect == 'sqlite':
+        op.execute(
+            'CREATE VIRTUAL TABLE search_index USING fts5('
+            "type UNINDEXED, object_id UNINDEXED, content, tokenize = 'porter unicode61')"
+        )
+        for type_code, table in enumerate(search_columns):
+            insert = (
+                'INSERT INTO search_index (rowid, type, object_id, content) '
+                f"VALUES (new.id * 3 + {type_code}, '{table}', new.id, {search_contents[table].format(row='new')});"
+            )
+            delete = f'DELETE FROM search_index WHERE rowid = old.id * 3 + {type_code};'
+            op.execute(f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON "{table}" BEGIN {insert} END')
+            op.execute(f'CREATE TRIGGER {table}_search_update AFTER UPDATE ON "{table}" BEGIN {delete} {insert} END')
+            op.execute(f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON "{table}" BEGIN {delete} END')
+            # Existing rows
+            content = search_contents[table].format(row=f'"{table}"')
+            op.execute(
+                'INSERT INTO search_index (rowid, type, object_id, content) '
+                f'SELECT id * 3 + {type_code}, \'{table}\', id, {content} FROM "{table}"'
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in search_columns:
+            op.execute(f'DROP INDEX ix_{table}_search_vector')
+            op.execute(f'DROP TRIGGER {table}_search_vector_update ON "{table}"')
+            op.execute(f'ALTER TABLE "{table}" DROP COLUMN search_vector')
+    elif dialect == 'sqlite':
+        for table in search_columns:
+            for operation in ['insert', 'update', 'delete']:
+                op.execute(f'DROP TRIGGER {table}_search_{operation}')
+        op.execute('DROP TABLE search_index')
@@ -0,0 +1,46 @@
+"""add indexes for foreign keys and filtered columns
+
+Revision ID: e65cbc373edf
+Revises: e6d13acc9922
+Create Date: 2026-10-18 08:05:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e65cbc373edf'
+down_revision = 'e6d13acc9922'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Duplicate assignments have been possible so far, remove them before adding
+    # the unique index
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            'DELETE FROM assignees_for_tasks a USING assignees_for_tasks b '
+            'WHERE a.ctid < b.ctid AND a.task_id = b.task_id AND a.assignee_id = b.assignee_id'
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            'DELETE FROM assignees_for_tasks WHERE rowid NOT IN '
+            '(SELECT min(rowid) FROM assignees_for_tasks GROUP BY task_id, assignee_id)'
+        )
+
+    op.create_index('ix_task_project_id_completed', 'task', ['project_id', 'completed'], unique=False)
+    op.create_index('ix_comment_task_id_created_at', 'comment', ['task_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_comment_author_id'), 'comment', ['author_id'], unique=False)
+    op.create_index('ix_assignees_for_tasks_task_id_assignee_id', 'assignees_for_tasks', ['task_id', 'assignee_id'], unique=True)
+    op.create_index('ix_assignees_for_tasks_assignee_id_task_id', 'assignees_for_tasks', ['assignee_id', 'task_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_assignees_for_tasks_assignee_id_task_id', table_name='assignees_for_tasks')
+    op.drop_index('ix_assignees_for_tasks_task_id_assignee_id', table_name='assignees_for_tasks')
+    op.drop_index(op.f('ix_comment_author_id'), table_name='comment')
+    op.drop_index('ix_comment_task_id_created_at', table_name='comment')
+    op.drop_index('ix_task_project_id_completed', table_name='task')